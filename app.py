@@ -1,50 +1,194 @@
 import streamlit as st
 import os
 import random
-import pandas as pd
-from src.ocr_engine import ocr_image, extract_total, extract_candidate_items
-from src.llm_engine import get_eco_report_from_deepseek 
-import json
-import re
-from src.nlp_engine import extract_candidate_item_lines, predict_items
-
-def parse_llm_json(raw_response):
-    """
-    智能解析函数：
-    1. 如果输入已经是字典，直接返回。
-    2. 如果是字符串，则尝试清洗并解析。
-    INTELIGENT PARSING FUNCTION
-    1. If input is already a dict, return as is.
-    2. If it's a string, attempt to clean and parse it.
-    """
-    # --- 类型保护 ---
-    # 1. Type Guarding ---
-    if isinstance(raw_response, dict):
-        return raw_response
-    
-    if not raw_response or not isinstance(raw_response, str):
-        return {"error": "Invalid input type: expected string or dict"}
-    
-    try:
-        # 尝试直接解析
-        # Try direct parsing
-        return json.loads(raw_response)
-    except json.JSONDecodeError:
-        try:
-            # 尝试正则提取 JSON 部分
-            # Try regex extraction of JSON part
-            json_pattern = r'(\{.*\})'
-            match = re.search(json_pattern, raw_response, re.DOTALL)
-            if match:
-                return json.loads(match.group(1))
-            else:
-                return {"error": "No valid JSON structure found"}
-        except Exception as e:
-            return {"error": f"Parsing failed: {str(e)}"}
-        
+import threading
+from src import tracing
+from src.ocr_engine import ocr_image, decode_image, extract_total, extract_candidate_items
+from src.llm_engine import stream_eco_report, parse_llm_json
+from src.nlp_engine import extract_candidate_item_lines, warm_up_classifier, reload_classifier
+from src.cascade import predict_items_cascade, receipt_confidence, needs_llm, lexicon_status, LLM_ESCALATION_THRESHOLD
+from src.history_store import get_history
+
+# --- 报告渲染：流式与一次性共用 ---
+# --- Report rendering, shared by the streamed and the cached/complete view ---
+REPORT_SECTIONS = ["header", "overview", "receipt", "insights", "tip", "context", "quote"]
+
+
+def section_for(path):
+    """Which part of the layout a streamed field belongs to."""
+    top, _, rest = path.partition(".")
+    if top == "header":
+        return "header"
+    if top in ("score", "consumption_category") or path == "sdg_impact.target":
+        return "overview"
+    if top == "receipt_summary" and rest:
+        return "receipt"
+    if rest.startswith(("positives", "concerns")):
+        return "insights"
+    if path == "audit_details.suggestion":
+        return "tip"
+    if path == "sdg_impact.explanation":
+        return "context"
+    if top == "soul_quote":
+        return "quote"
+    return None
+
+
+def set_report_field(report, path, value):
+    """Write a streamed (dotted path, value) into the partial report."""
+    keys = path.split(".")
+    cur = report
+    for k, nxt in zip(keys, keys[1:]):
+        new = lambda: [] if nxt.isdigit() else {}
+        if isinstance(cur, list):
+            while len(cur) <= int(k):
+                cur.append(new())
+            cur = cur[int(k)]
+        else:
+            cur = cur.setdefault(k, new())
+    last = keys[-1]
+    if isinstance(cur, list):
+        while len(cur) <= int(last):
+            cur.append(None)
+        cur[int(last)] = value
+    else:
+        cur[last] = value
+
+
+def render_section(name, report, slot):
+    with slot.container():
+        if name == "header":
+            # 1. 动态标题与评分
+            # 1. Dynamic Title and Score
+            st.markdown(f"#### 🌟 {report.get('header', 'Consumption Audit Report')}")
+
+        elif name == "overview":
+            c1, c2, c3 = st.columns([2, 2, 3])
+            score = report.get('score', 0)
+            c1.metric("Eco Score", f"{score}/100")
+
+            # 显示消费类别
+            # Display Consumption Category
+            category = report.get('consumption_category', 'Others')
+            c2.info(f"📁 Category: **{category}**")
+
+            # 显示核心 SDG
+            # Display Core SDG
+            sdg_data = report.get('sdg_impact', {})
+            c3.success(f"🎯 {sdg_data.get('target', 'SDG Tracking')}")
+
+            st.divider()
+
+        elif name == "receipt":
+            # 2. 账单还原明细 (用 Expander 收纳)
+            # 2. Receipt Details (Using Expander)
+            with st.expander("🧾 View Cleaned Receipt Details",expanded=True):
+                summary = report.get('receipt_summary', {})
+                items = summary.get('items', [])
+                if items:
+                    st.table(items)
+                    st.markdown(f"**Total Amount: {summary.get('total_amount', 'N/A')}**")
+
+        elif name == "insights":
+            # 3. 专家审计视角 (左侧优点，右侧风险)
+            # 3. Expert Audit Perspective (Left: Positives, Right: Risks)
+            st.markdown("### 🔍 Expert Insights")
+            audit = report.get('audit_details', {})
+
+            col_a, col_b = st.columns(2)
+            with col_a:
+                st.write("**✅ Strengths:**")
+                for p in audit.get('positives', []):
+                    st.write(f"- {p}")
+
+            with col_b:
+                st.write("**⚠️ Concerns:**")
+                for c in audit.get('concerns', []):
+                    st.write(f"- {c}")
+
+        elif name == "tip":
+            # 4. 暖心建议 (不爹味的设计)
+            # 4. Friendly Suggestions (Non-preachy Design)
+            audit = report.get('audit_details', {})
+            st.chat_message("assistant").write(
+                f"💬 **Friend-like Tip:** {audit.get('suggestion', 'Keep up the good work!')}"
+            )
+
+        elif name == "context":
+            # 5. SDG 深度背景 (Container 包装)
+            # 5. SDG In-depth Context (Using Container)
+            sdg_data = report.get('sdg_impact', {})
+            if sdg_data.get('explanation'):
+                with st.container(border=True):
+                    st.markdown("**💡 Sustainability Context:**")
+                    st.write(sdg_data.get('explanation'))
+
+        elif name == "quote":
+            # 6. 底部彩蛋
+            # 6. Footer Easter Egg
+            st.markdown(f"<p style='text-align: center; color: gray; font-style: italic; padding-top: 20px;'>\"{report.get('soul_quote', 'Every purchase is a vote for the world you want.')}\"</p>", unsafe_allow_html=True)
+
+
+def render_report(report, slots):
+    for name in REPORT_SECTIONS:
+        render_section(name, report, slots[name])
+
+
+def render_history(history):
+    """Spending and categories over time, read from the aggregate tables of src/history_store.py."""
+    import pandas as pd
+
+    summary = history.summary()
+    if not summary["receipts"]:
+        st.info("No receipts analysed yet. Results are saved here after each analysis.")
+        return
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Receipts", summary["receipts"])
+    c2.metric("Total Spend", f"{summary['spend']:.2f}")
+    c3.metric("Average Eco Score", "N/A" if summary["avg_score"] is None else f"{summary['avg_score']}/100")
+
+    granularity = st.radio("Period", ["day", "week", "month", "year"], index=2, horizontal=True)
+    periods = pd.DataFrame(history.spending_by_period(granularity))
+    st.markdown("#### 💰 Spending over time")
+    st.bar_chart(periods, x="period", y="spend")
+
+    by_category = pd.DataFrame(history.categories_by_period(granularity))
+    if not by_category.empty:
+        st.markdown("#### 🛒 Items by category")
+        st.bar_chart(by_category, x="period", y="items", color="category")
+        st.dataframe(pd.DataFrame(history.category_totals()), use_container_width=True)
+
+    eco = pd.DataFrame(history.eco_spending_by_period(granularity))
+    if not eco.empty:
+        st.markdown("#### 🌍 Spend by consumption category (AI reports)")
+        st.dataframe(eco, use_container_width=True)
+
+
+def render_debug_panel(run_spans):
+    """Stage timings of this run plus the process-wide metrics, for SSCA_DEBUG_PANEL=1."""
+    import pandas as pd
+
+    with st.expander("🛠️ Debug: stage timings", expanded=False):
+        if run_spans:
+            st.dataframe(pd.DataFrame([sp.to_dict() for sp in run_spans]), use_container_width=True)
+        else:
+            st.caption("No stage ran in this rerun (results came from the session state).")
+        st.caption("Recent spans (all sessions)")
+        st.dataframe(pd.DataFrame(tracing.recent_spans(50)), use_container_width=True)
+        c1, c2 = st.columns(2)
+        c1.download_button("Prometheus metrics", tracing.prometheus_text(), file_name="ssca_metrics.prom")
+        c2.download_button("Spans (JSON lines)", tracing.json_lines(), file_name="ssca_spans.jsonl")
+
+
 # --- 1. 全局配置 ---
 # --- 1. Global Config ---
 SROIE_IMG_DIR = r"D:\15_MAI\7002\GROUP ASSIGNMENT\git\train\img"
+# 调试面板：显示每个阶段的耗时
+# Debug panel with per-stage timings; turns tracing on for the process
+DEBUG_PANEL = os.environ.get("SSCA_DEBUG_PANEL", "0") == "1"
+if DEBUG_PANEL:
+    tracing.set_enabled(True)
+run_spans = tracing.begin_capture() if tracing.is_enabled() else None
 
 st.set_page_config(page_title="Eco-Scan AI", layout="wide", page_icon="🌱")
 
@@ -57,6 +201,20 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# 进程级模型预热：后台线程加载分类器，页面无需等待；所有会话共享
+# Process-wide warm-up: a background thread loads the classifier while the page renders,
+# shared by all sessions. The first classification waits for it if it is still loading.
+@st.cache_resource(show_spinner=False)
+def start_model_warm_up():
+    thread = threading.Thread(target=warm_up_classifier, name="ssca-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+start_model_warm_up()
+# 模型目录被替换时重新加载
+# Reload the weights if the model directory was replaced on disk
+reload_classifier(only_if_changed=True)
+
 st.title("🌱 Sustainable Consumption Analyzer")
 st.caption("Using Tesseract OCR & DeepSeek-V3 Intelligence")
 
@@ -68,6 +226,7 @@ with st.sidebar:
         if os.path.exists(SROIE_IMG_DIR):
             image_files = [f for f in os.listdir(SROIE_IMG_DIR) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
             st.session_state.current_img = os.path.join(SROIE_IMG_DIR, random.choice(image_files))
+            st.session_state.decoded_img = None
             st.session_state.ocr_done = False
             st.session_state.ai_report = None
         else:
@@ -77,16 +236,14 @@ with st.sidebar:
     # Option B: Choose from local upload (your new requirement)
     uploaded_file = st.file_uploader("📂 Choose receipts from documents", type=['jpg', 'jpeg', 'png'])
     if uploaded_file is not None:
-        temp_upload_path = "temp_upload.jpg"
-        with open(temp_upload_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        
-        if st.session_state.get('last_uploaded') != uploaded_file.name:
-            st.session_state.current_img = temp_upload_path
+        # 上传内容只保存在本会话内存中，不写临时文件
+        # The upload stays in this session's memory: no shared temp file on disk
+        if st.session_state.get('last_uploaded') != uploaded_file.file_id:
+            st.session_state.current_img = uploaded_file.getvalue()
+            st.session_state.decoded_img = None
             st.session_state.ocr_done = False
             st.session_state.ai_report = None
-            st.session_state.last_uploaded = uploaded_file.name
+            st.session_state.last_uploaded = uploaded_file.file_id
             st.session_state.is_uploaded = True
 
     
@@ -98,21 +255,30 @@ if 'current_img' in st.session_state:
 
     with col_left:
         st.subheader("🖼️ Receipt Preview")
-        st.image(st.session_state.current_img, use_container_width=True)
+        # 每张小票只解码一次，解码结果保存在会话中
+        # Each receipt is decoded once; the bytes and decoded image are kept in the session
+        if st.session_state.get('decoded_img') is None:
+            st.session_state.decoded_img = decode_image(st.session_state.current_img)
+        img_bytes, img = st.session_state.decoded_img
+        st.image(img, use_container_width=True)
         
         # 基础 OCR 处理触发器
         if not st.session_state.get('ocr_done'):
-            with st.spinner("OCR Engine is reading..."):
-                full_text, lines = ocr_image(st.session_state.current_img)
+            with st.spinner("OCR Engine is reading..."), tracing.span("app.ocr"):
+                full_text, lines = ocr_image(img_bytes, image=img)
                 total = extract_total(lines)
                 items = extract_candidate_items(lines)
                 st.session_state.raw_data = {"text": full_text, "lines": lines, "total": total, "items": items}
+                st.session_state.history_id = None
+                st.session_state.receipt_confidence = None
+                st.session_state.needs_llm = False
+                st.session_state.item_predictions = None
                 st.session_state.ocr_done = True
 
     with col_right:
         # 使用 Tabs 区分两个“端”的功能
         # Use Tabs to separate two "modes" of functionality
-        tab_std, tab_ai = st.tabs(["📊 Standard Mode", "🧠 DeepSeek AI Expert"])
+        tab_std, tab_ai, tab_hist = st.tabs(["📊 Standard Mode", "🧠 DeepSeek AI Expert", "📈 History"])
 
     # --- Tab 1: 基础模式 (本地模型驱动) ---
     # --- Tab 1. Standard Mode (Local Model Driven) ---
@@ -124,12 +290,32 @@ if 'current_img' in st.session_state:
         if raw_text:
             # 1. 提取候选行 (调用队友的过滤逻辑)
             # 1. Extract candidate lines (using teammate's filtering logic)
-            with st.spinner("Filtering receipt lines..."):
+            with st.spinner("Filtering receipt lines..."), tracing.span("app.filter"):
                 candidate_items = extract_candidate_item_lines(raw_text)
             
             if candidate_items:
-                with st.spinner("Classifying items using local model..."):
-                    results = predict_items(candidate_items)
+                # 先查词典，词典未命中的行才交给模型
+                # Lexicon first; only the lines it does not know go to the model
+                with st.spinner("Classifying items using local model..."), tracing.span("app.classify"):
+                    results = predict_items_cascade(candidate_items, batched=True)
+                st.session_state.receipt_confidence = receipt_confidence(results)
+                st.session_state.needs_llm = needs_llm(results)
+                st.session_state.item_predictions = results
+                n_lexicon = sum(res.get('tier') == 'lexicon' for res in results)
+                st.caption(f"Lexicon: {n_lexicon} lines · Model: {len(results) - n_lexicon} lines · "
+                           f"Receipt confidence: {st.session_state.receipt_confidence:.0%}")
+                # 词典与当前模型不匹配时被忽略，提示重建
+                # A lexicon built for another model is ignored; say so instead of only logging it
+                lexicon_problem = lexicon_status()["invalid_reason"]
+                if lexicon_problem:
+                    st.caption(f"⚠️ Item lexicon ignored: {lexicon_problem}.")
+
+                # 每张小票保存一次到历史记录 (同一张小票不会重复计数)
+                # Save each receipt to the history once (the same receipt is never counted twice)
+                history = get_history()
+                if history is not None and st.session_state.get('history_id') is None:
+                    st.session_state.history_id = history.record_receipt(
+                        raw_text, results, st.session_state.raw_data.get('total'))
                 
                 
                 filtered_results = [res for res in results if res['category'] != 'other']
@@ -137,6 +323,7 @@ if 'current_img' in st.session_state:
                 if filtered_results:
                     # 转换成 DataFrame 方便统计
                     # Convert to DataFrame for easier stats
+                    import pandas as pd
                     df_res = pd.DataFrame(filtered_results)
                     
                     # 布局：左边显示指标和表格，右边显示饼图
@@ -190,86 +377,66 @@ if 'current_img' in st.session_state:
             st.markdown("### 🤖 DeepSeek Sustainability Audit")
             
             
+            # 本地置信度足够时无需调用大模型
+            # The local tiers are sure enough for most receipts; the AI audit is suggested only when they are not
+            if st.session_state.get('needs_llm'):
+                st.warning(f"Local confidence is low ({st.session_state.receipt_confidence:.0%} < "
+                           f"{LLM_ESCALATION_THRESHOLD:.0%}): the AI audit is recommended for this receipt.")
+            elif st.session_state.get('receipt_confidence') is not None:
+                st.caption("The local model is confident about this receipt; the AI audit is optional.")
+
+            streamed_now = False
             if st.button("🚀 Run DeepSeek-V3 Analysis", type="primary", use_container_width=True):
-                with st.spinner("AI experts are conducting in-depth analysis of the bills..."):
-                    # 获取大模型返回的原始文本并解析为 JSON
-                    # Get raw response from large model and parse to JSON
-                    raw_response = get_eco_report_from_deepseek(st.session_state.raw_data['text'])
-                    # 这里调用我们之前写的 parse_llm_json 函数
-                    # Here we use our previously defined parse_llm_json function
-                    report = parse_llm_json(raw_response) 
-                    st.session_state.ai_report = report
-
-            if st.session_state.get('ai_report'):
+                # 流式输出：每个字段完整后立即渲染对应区块
+                # Streamed completion: each section is drawn as soon as its fields are complete
+                slots = {name: st.empty() for name in REPORT_SECTIONS}
+                partial = {}
+                report = None
+                with st.spinner("AI experts are conducting in-depth analysis of the bills..."), tracing.span("app.llm"):
+                    # 复用标准模式的分类结果，compact 提示词不再重复分类
+                    # Reuse the Standard tab's predictions, so the compact prompt does not classify again
+                    for path, value in stream_eco_report(st.session_state.raw_data['text'],
+                                                         predictions=st.session_state.get('item_predictions')):
+                        if not path:
+                            report = parse_llm_json(value)
+                            break
+                        set_report_field(partial, path, value)
+                        section = section_for(path)
+                        if section:
+                            render_section(section, partial, slots[section])
+                st.session_state.ai_report = report
+                streamed_now = True
+                if st.session_state.get('history_id') is not None:
+                    get_history().attach_report(st.session_state.history_id, report)
+                if report and "error" not in report:
+                    render_report(report, slots)
+                else:
+                    for slot in slots.values():
+                        slot.empty()
+                    st.error("❌ AI Parsing Error: Could not generate a structured report. Please try again.")
+
+            if st.session_state.get('ai_report') and not streamed_now:
                 report = st.session_state.ai_report
                 
                 
                 if report and "error" not in report:
-                    # 1. 动态标题与评分
-                    # 1. Dynamic Title and Score
-                    st.markdown(f"#### 🌟 {report.get('header', 'Consumption Audit Report')}")
-                    
-                    c1, c2, c3 = st.columns([2, 2, 3])
-                    score = report.get('score', 0)
-                    c1.metric("Eco Score", f"{score}/100")
-                    
-                    # 显示消费类别
-                    # Display Consumption Category
-                    category = report.get('consumption_category', 'Others')
-                    c2.info(f"📁 Category: **{category}**")
-                    
-                    # 显示核心 SDG
-                    # Display Core SDG
-                    sdg_data = report.get('sdg_impact', {})
-                    c3.success(f"🎯 {sdg_data.get('target', 'SDG Tracking')}")
-
-                    st.divider()
-
-                    # 2. 账单还原明细 (用 Expander 收纳)
-                    # 2. Receipt Details (Using Expander)
-                    with st.expander("🧾 View Cleaned Receipt Details",expanded=True):
-                        summary = report.get('receipt_summary', {})
-                        items = summary.get('items', [])
-                        if items:
-                            st.table(items)
-                            st.markdown(f"**Total Amount: {summary.get('total_amount', 'N/A')}**")
-
-                    # 3. 专家审计视角 (左侧优点，右侧风险)
-                    # 3. Expert Audit Perspective (Left: Positives, Right: Risks)
-                    st.markdown("### 🔍 Expert Insights")
-                    audit = report.get('audit_details', {})
-                    
-                    col_a, col_b = st.columns(2)
-                    with col_a:
-                        st.write("**✅ Strengths:**")
-                        for p in audit.get('positives', []):
-                            st.write(f"- {p}")
-                    
-                    with col_b:
-                        st.write("**⚠️ Concerns:**")
-                        for c in audit.get('concerns', []):
-                            st.write(f"- {c}")
-
-                    # 4. 暖心建议 (不爹味的设计)
-                    # 4. Friendly Suggestions (Non-preachy Design)
-                    st.chat_message("assistant").write(
-                        f"💬 **Friend-like Tip:** {audit.get('suggestion', 'Keep up the good work!')}"
-                    )
-
-                    # 5. SDG 深度背景 (Container 包装)
-                    # 5. SDG In-depth Context (Using Container)
-                    if sdg_data.get('explanation'):
-                        with st.container(border=True):
-                            st.markdown("**💡 Sustainability Context:**")
-                            st.write(sdg_data.get('explanation'))
-
-                    # 6. 底部彩蛋
-                    # 6. Footer Easter Egg
-                    st.markdown(f"<p style='text-align: center; color: gray; font-style: italic; padding-top: 20px;'>\"{report.get('soul_quote', 'Every purchase is a vote for the world you want.')}\"</p>", unsafe_allow_html=True)
-
+                    render_report(report, {name: st.empty() for name in REPORT_SECTIONS})
                 else:
                     st.error("❌ AI Parsing Error: Could not generate a structured report. Please try again.")
-            else:
+            elif not streamed_now:
                 st.info("👋 Ready to analyze? Click the button above to start your AI-powered sustainability audit.")
+
+        # --- Tab 3: 历史记录 (按类别与时间统计) ---
+        # --- Tab 3: History (spending by category over time) ---
+        with tab_hist:
+            st.markdown("### 📈 Consumption History")
+            history = get_history()
+            if history is None:
+                st.info("History is disabled (SSCA_HISTORY_DB is empty).")
+            else:
+                render_history(history)
 else:
-    st.info("👈 select first")
\ No newline at end of file
+    st.info("👈 select first")
+
+if DEBUG_PANEL:
+    render_debug_panel(run_spans)
@@ -0,0 +1,129 @@
+"""
+Cascade benchmark: tier hit rates, model time and LLM spend per receipt.
+
+    python -m benchmarks.bench_cascade
+    python -m benchmarks.bench_cascade --build-split 0.5 --min-confidence 0.9 --json
+
+The bundled receipts are OCR'd (through the OCR cache) and split in two: the
+lexicon is built from the first --build-split of them, as src.cascade build would,
+and the rest are classified twice with the classification cache cleared before
+each receipt:
+
+    model only   every candidate line through predict_items, every receipt to the LLM
+    cascade      lexicon -> predict_items -> LLM only for escalated receipts
+
+LLM calls go to the local stub (src/llm_stub_server.py). Its token counts are
+priced with SSCA_LLM_PRICE_IN_PER_M / SSCA_LLM_PRICE_OUT_PER_M like real calls.
+"Agreement" is the share of lexicon hits whose label equals the model's label.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from src import cascade, llm_engine, nlp_engine
+from src.batch_pipeline import list_images
+from src.nlp_engine import extract_candidate_item_lines, predict_items
+from src.ocr_engine import ocr_image
+
+
+def llm_cost(texts, predictions):
+    """Stub LLM calls for texts; returns (calls, cost_usd)."""
+    from src.llm_client import AsyncLLMClient
+    from src.llm_stub_server import start_stub_server
+
+    server, base_url = start_stub_server()
+    before = sum(s["cost_usd"] for s in llm_engine.TOKEN_STATS.values())
+
+    async def run():
+        async with AsyncLLMClient(base_url=base_url, api_key="stub") as llm:
+            await asyncio.gather(*(llm.eco_report(t, use_cache=False, predictions=p)
+                                   for t, p in zip(texts, predictions)))
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+    return len(texts), sum(s["cost_usd"] for s in llm_engine.TOKEN_STATS.values()) - before
+
+
+def timed_per_receipt(fn, line_lists):
+    outputs, total = [], 0.0
+    for lines in line_lists:
+        nlp_engine.clear_cache()
+        t0 = time.perf_counter()
+        outputs.append(fn(lines) if lines else [])
+        total += time.perf_counter() - t0
+    return outputs, total * 1000 / max(len(line_lists), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--img-dirs", nargs="+", default=["train/img", "train/pic"])
+    parser.add_argument("--build-split", type=float, default=0.5, help="Share of receipts used to build the lexicon")
+    parser.add_argument("--min-count", type=int, default=1)
+    parser.add_argument("--min-confidence", type=float, default=0.9)
+    parser.add_argument("--threshold", type=float, default=cascade.LLM_ESCALATION_THRESHOLD)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    paths = [p for d in args.img_dirs if os.path.isdir(d) for p in list_images(d)]
+    if not paths:
+        parser.error("no images found in " + ", ".join(args.img_dirs))
+    texts = [ocr_image(p)[0] for p in paths]
+    n_build = int(len(texts) * args.build_split)
+    build, evaluate = texts[:n_build], texts[n_build:]
+
+    nlp_engine.get_classifier()
+    lexicon, _ = cascade.build_lexicon(build, args.min_count, args.min_confidence)
+    cascade._LEXICON = lexicon
+    line_lists = [extract_candidate_item_lines(t) for t in evaluate]
+
+    # Warm-up, so neither run pays for the first forward pass
+    predict_items(["warm up"])
+    model_preds, model_ms = timed_per_receipt(predict_items, line_lists)
+    cascade.STATS.reset()
+    cascade_preds, cascade_ms = timed_per_receipt(cascade.predict_items_cascade, line_lists)
+    escalate = [cascade.needs_llm(p, args.threshold) for p in cascade_preds]
+    for e in escalate:
+        cascade.STATS.add_receipt(e)
+
+    lexicon_hits = [(c, m) for cp, mp in zip(cascade_preds, model_preds)
+                    for c, m in zip(cp, mp) if c.get("tier") == "lexicon"]
+    agreement = sum(c["category"] == m["category"] for c, m in lexicon_hits) / len(lexicon_hits) if lexicon_hits else None
+
+    all_calls, all_cost = llm_cost(evaluate, model_preds)
+    esc_texts = [t for t, e in zip(evaluate, escalate) if e]
+    esc_preds = [p for p, e in zip(cascade_preds, escalate) if e]
+    esc_calls, esc_cost = llm_cost(esc_texts, esc_preds) if esc_texts else (0, 0.0)
+
+    n = max(len(evaluate), 1)
+    result = {
+        "receipts": {"build": len(build), "evaluate": len(evaluate)},
+        "lexicon_entries": len(lexicon),
+        "tiers": cascade.cascade_stats(),
+        "lexicon_agreement": round(agreement, 4) if agreement is not None else None,
+        "model_ms_per_receipt": {"model_only": round(model_ms, 3), "cascade": round(cascade_ms, 3)},
+        "llm_calls_per_receipt": {"model_only": round(all_calls / n, 4), "cascade": round(esc_calls / n, 4)},
+        "llm_cost_usd_per_receipt": {"model_only": round(all_cost / n, 6), "cascade": round(esc_cost / n, 6)},
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        t = result["tiers"]
+        print(f"{len(build)} receipts for the lexicon ({len(lexicon)} entries), {len(evaluate)} evaluated")
+        print(f"tier 1 lexicon : {t['lexicon_hit_rate']:.1%} of lines (agreement with the model: "
+              f"{'-' if agreement is None else f'{agreement:.1%}'})")
+        print(f"tier 2 model   : {t['model_rate']:.1%} of lines")
+        print(f"tier 3 LLM     : {t['llm_escalation_rate']:.1%} of receipts (threshold {args.threshold})")
+        for key, label in (("model_ms_per_receipt", "model ms / receipt"),
+                           ("llm_calls_per_receipt", "LLM calls / receipt"),
+                           ("llm_cost_usd_per_receipt", "LLM USD / receipt")):
+            r = result[key]
+            print(f"{label:<22} model only {r['model_only']:>10}   cascade {r['cascade']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+End-to-end benchmark of every pipeline stage over the bundled receipts.
+
+    python -m benchmarks.bench_e2e --out bench.json
+    python -m benchmarks.bench_e2e --baseline bench.json --threshold 0.25   # exit 1 on regression
+
+Stages, each run over every image before the next one starts:
+    ocr_image -> extract_total -> extract_candidate_items -> extract_candidate_item_lines
+    -> predict_items -> llm (AsyncLLMClient against the local stub, src/llm_stub_server.py)
+
+Per stage: p50/p95/mean latency per receipt, throughput, the one-off load time
+(OCR engine, classifier, LLM client) measured before the first call, and memory:
+
+    stage +MB    highest RSS seen during the stage (sampled every 10 ms, Linux
+                 /proc) minus the RSS when it started, i.e. what this stage needed
+    kept +MB     RSS after the stage minus RSS before it
+    process MB   ru_maxrss after the stage: the peak of the whole process so far,
+                 monotonic, so it includes every earlier stage
+
+OCR, classification and report caches are bypassed so every call does the
+real work, unless --warm-caches.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src import nlp_engine, ocr_backends
+from src.batch_pipeline import list_images
+from src.nlp_engine import extract_candidate_item_lines, predict_items
+from src.ocr_engine import ocr_image, extract_total, extract_candidate_items
+
+
+STAGES = (
+    "ocr_image", "extract_total", "extract_candidate_items",
+    "extract_candidate_item_lines", "predict_items", "llm",
+)
+# Metrics compared with --baseline; higher is worse for all of them
+COMPARED = ("p50_ms", "p95_ms")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def current_rss_mb():
+    """Resident set size now (Linux only), unlike ru_maxrss which never goes down."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class StageMemory:
+    """RSS before, after and at its highest during a `with` block, sampled from a thread."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.before = self.after = self.high = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.high = max(self.high, current_rss_mb() or 0.0)
+
+    def __enter__(self):
+        self.before = current_rss_mb()
+        if self.before is not None:
+            self.high = self.before
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.before is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self.after = current_rss_mb()
+        self.high = max(self.high, self.after)
+
+    def to_dict(self):
+        if self.before is None:
+            return {"stage_rss_mb": None, "kept_rss_mb": None}
+        return {"stage_rss_mb": round(self.high - self.before, 1), "kept_rss_mb": round(self.after - self.before, 1)}
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+
+def summarize(samples_ms, wall_s, load_s, mem):
+    return {
+        "calls": len(samples_ms),
+        "p50_ms": round(pct(samples_ms, 0.5), 3),
+        "p95_ms": round(pct(samples_ms, 0.95), 3),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "throughput_per_s": round(len(samples_ms) / wall_s, 2) if wall_s else None,
+        "load_s": round(load_s, 3) if load_s is not None else None,
+        **mem.to_dict(),
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_stage(fn, inputs, repeat, before_each=None):
+    samples = []
+    t_start = time.perf_counter()
+    outputs = []
+    for _ in range(repeat):
+        outputs = []
+        for x in inputs:
+            if before_each:
+                before_each()
+            t0 = time.perf_counter()
+            outputs.append(fn(x))
+            samples.append((time.perf_counter() - t0) * 1000)
+    return outputs, samples, time.perf_counter() - t_start
+
+
+def run_llm_stage(texts, repeat, latency, use_cache):
+    from src.llm_stub_server import start_stub_server
+
+    server, base_url = start_stub_server(latency=latency)
+    os.environ.setdefault("HF_TOKEN", "stub")
+    from src.llm_client import AsyncLLMClient
+
+    async def run():
+        t0 = time.perf_counter()
+        llm = AsyncLLMClient(base_url=base_url, api_key="stub")
+        load_s = time.perf_counter() - t0
+        samples, errors = [], 0
+        t_start = time.perf_counter()
+        async with llm:
+            for _ in range(repeat):
+                for text in texts:
+                    t0 = time.perf_counter()
+                    report = await llm.eco_report(text, use_cache=use_cache)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                    errors += "error" in report
+        return samples, time.perf_counter() - t_start, load_s, errors
+
+    try:
+        return asyncio.run(run())
+    finally:
+        server.shutdown()
+
+
+def run_all(paths, stages, repeat, warm_caches, llm_latency):
+    results = {}
+
+    with StageMemory() as mem:
+        t0 = time.perf_counter()
+        ocr_backends.get_ocr_backend()
+        load = time.perf_counter() - t0
+        ocr_out, samples, wall = run_stage(lambda p: ocr_image(p, use_cache=warm_caches), paths, repeat)
+    if "ocr_image" in stages:
+        results["ocr_image"] = summarize(samples, wall, load, mem)
+    texts = [text for text, _ in ocr_out]
+    line_lists = [lines for _, lines in ocr_out]
+
+    for name, fn, inputs in (
+        ("extract_total", extract_total, line_lists),
+        ("extract_candidate_items", extract_candidate_items, line_lists),
+        ("extract_candidate_item_lines", extract_candidate_item_lines, texts),
+    ):
+        if name in stages:
+            with StageMemory() as mem:
+                _, samples, wall = run_stage(fn, inputs, repeat)
+            results[name] = summarize(samples, wall, None, mem)
+
+    if "predict_items" in stages:
+        items = [extract_candidate_item_lines(t) for t in texts]
+        with StageMemory() as mem:
+            t0 = time.perf_counter()
+            nlp_engine.get_classifier()
+            load = time.perf_counter() - t0
+            _, samples, wall = run_stage(predict_items, items, repeat,
+                                         before_each=None if warm_caches else nlp_engine.clear_cache)
+        results["predict_items"] = summarize(samples, wall, load, mem)
+
+    if "llm" in stages:
+        with StageMemory() as mem:
+            samples, wall, load, errors = run_llm_stage(texts, repeat, llm_latency, warm_caches)
+        results["llm"] = dict(summarize(samples, wall, load, mem), errors=errors)
+    return results
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """Stages whose latency grew by more than `threshold` (and more than min_delta_ms)."""
+    regressions = []
+    for stage, cur in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        for metric in COMPARED:
+            old, new = base.get(metric), cur.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > min_delta_ms:
+                regressions.append({"stage": stage, "metric": metric, "baseline": old, "current": new,
+                                    "change": round(new / old - 1, 3) if old else None})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--img-dirs", nargs="+", default=["train/img", "train/pic"])
+    parser.add_argument("--limit", type=int, default=None, help="Images per directory")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--warm-caches", action="store_true", help="Let the OCR/NLP/LLM caches answer")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the stub waits per report")
+    parser.add_argument("--out", default=None, help="Write the JSON results to this file")
+    parser.add_argument("--baseline", default=None, help="Earlier --out file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative latency increase")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore smaller absolute increases")
+    parser.add_argument("--json", action="store_true", help="Print the JSON results instead of a table")
+    args = parser.parse_args()
+
+    paths = []
+    for d in args.img_dirs:
+        if os.path.isdir(d):
+            paths.extend(list_images(d)[:args.limit])
+    if not paths:
+        parser.error("no images found in " + ", ".join(args.img_dirs))
+
+    stages = run_all(paths, set(args.stages), args.repeat, args.warm_caches, args.llm_latency)
+    current = {
+        "meta": {
+            "images": len(paths),
+            "repeat": args.repeat,
+            "warm_caches": args.warm_caches,
+            "ocr_backend": ocr_backends.current_backend_name(),
+            "nlp_backend": nlp_engine.NLP_BACKEND,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": stages,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(current, json.load(f), args.threshold, args.min_delta_ms)
+        current["regressions"] = regressions
+
+    if args.json:
+        print(json.dumps(current, indent=2))
+    else:
+        print(f"{len(paths)} images, repeat={args.repeat}, ocr={current['meta']['ocr_backend']}, "
+              f"nlp={current['meta']['nlp_backend']}")
+        print(f"{'stage':<30}{'p50 ms':>10}{'p95 ms':>10}{'per s':>9}{'load s':>8}"
+              f"{'stage +MB':>11}{'kept +MB':>10}{'process MB':>12}")
+        for name, s in stages.items():
+            cells = [s[k] if s[k] is not None else "-"
+                     for k in ("load_s", "stage_rss_mb", "kept_rss_mb", "process_peak_rss_mb")]
+            print(f"{name:<30}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['throughput_per_s']:>9}"
+                  f"{cells[0]:>8}{cells[1]:>11}{cells[2]:>10}{cells[3]:>12}")
+        for r in regressions:
+            print(f"REGRESSION {r['stage']} {r['metric']}: {r['baseline']} -> {r['current']} ms (+{r['change']:.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
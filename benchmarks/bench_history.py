@@ -0,0 +1,108 @@
+"""
+History store benchmark: ingest synthetic receipts, then time the dashboard queries.
+
+    python -m benchmarks.bench_history
+    python -m benchmarks.bench_history --receipts 50000 --days 730 --json
+
+Receipts are spread over --days days with 3-15 classified lines each, and a
+third of them get an LLM report. The queries only read the daily aggregate
+tables, so their latency depends on the number of days and categories, not on
+the number of receipts. --check also compares the incrementally maintained
+aggregates with a rebuild from the raw rows (exit 1 on a difference).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from src.history_store import HistoryStore
+from src.nlp_engine import LABELS
+
+
+ECO_CATEGORIES = ["Groceries", "Dining", "Household", "Others"]
+QUERIES = {
+    "summary": lambda h: h.summary(),
+    "spending_by_month": lambda h: h.spending_by_period("month"),
+    "spending_by_day": lambda h: h.spending_by_period("day"),
+    "category_totals": lambda h: h.category_totals(),
+    "categories_by_month": lambda h: h.categories_by_period("month"),
+    "eco_spending_by_month": lambda h: h.eco_spending_by_period("month"),
+}
+
+
+def make_receipts(count: int, days: int, rng: random.Random):
+    t_end = time.time()
+    for i in range(count):
+        preds = [{"line": f"item {rng.randrange(5000)}", "category": rng.choice(LABELS),
+                  "confidence": round(rng.uniform(0.3, 1.0), 4)} for _ in range(rng.randint(3, 15))]
+        rec = {"key": f"bench-{i}", "text": "", "predictions": preds,
+               "total": f"{rng.uniform(2, 300):.2f}", "ts": t_end - rng.uniform(0, days * 86400)}
+        if rng.random() < 1 / 3:
+            rec["report"] = {"score": rng.randint(10, 95), "consumption_category": rng.choice(ECO_CATEGORIES)}
+        yield rec
+
+
+def snapshot(history: HistoryStore):
+    return {name: q(history) for name, q in QUERIES.items() if name != "summary"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--batch", type=int, default=500, help="Receipts per record_many transaction")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = HistoryStore(os.path.join(tmp, "history.sqlite"))
+        receipts = list(make_receipts(args.receipts, args.days, random.Random(args.seed)))
+
+        t0 = time.perf_counter()
+        for start in range(0, len(receipts), args.batch):
+            history.record_many(receipts[start:start + args.batch])
+        ingest_s = time.perf_counter() - t0
+
+        result = {
+            "receipts": args.receipts,
+            "items": sum(len(r["predictions"]) for r in receipts),
+            "ingest_s": round(ingest_s, 2),
+            "receipts_per_s": round(args.receipts / ingest_s),
+            "query_ms": {},
+        }
+        for name, query in QUERIES.items():
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                query(history)
+                samples.append((time.perf_counter() - t0) * 1000)
+            result["query_ms"][name] = {"p50": round(statistics.median(samples), 3), "max": round(max(samples), 3)}
+
+        ok = True
+        if args.check:
+            incremental = snapshot(history)
+            history.rebuild_aggregates()
+            ok = incremental == snapshot(history)
+            result["aggregates_match_rebuild"] = ok
+        history.close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"ingested {result['receipts']} receipts / {result['items']} items in {result['ingest_s']}s "
+              f"({result['receipts_per_s']} receipts/s)")
+        for name, t in result["query_ms"].items():
+            print(f"  {name:24s} p50 {t['p50']:8.3f} ms   max {t['max']:8.3f} ms")
+        if args.check:
+            print("aggregates match rebuild" if ok else "MISMATCH between incremental aggregates and rebuild")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
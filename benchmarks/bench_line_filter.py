@@ -0,0 +1,203 @@
+"""
+Line filtering: the former per-engine loops against src/line_filter.py.
+
+    python -m benchmarks.bench_line_filter --check          # golden check on train/img OCR output
+    python -m benchmarks.bench_line_filter --lines 1000 10000 --json
+
+--check runs OCR on every image of --img-dir (cached after the first run), plus
+synthetic edge-case lines, and fails if any function gives a different result
+from the reference copies kept below, or if no receipt could be read.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from src import line_filter
+from src.ocr_engine import ocr_image
+
+
+# ---- Reference implementations, as they were before src/line_filter.py ----
+
+def legacy_normalize_text(s):
+    if not isinstance(s, str): return ""
+    s = s.lower()
+    s = re.sub(r"\b(rm|myr|usd)\b", " ", s)
+    s = re.sub(r"\b\d{1,3}(?:,\d{3})*(?:\.\d{2})\b", " ", s)
+    s = re.sub(r"\b\d+\b", " ", s)
+    s = re.sub(r"[^a-z\s\-\&\/]", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def legacy_looks_like_non_item(line):
+    if not isinstance(line, str): return True
+    low = line.strip().lower()
+    if len(low) < 2: return True
+    if sum(c.isalpha() for c in low) <= 1: return True
+    blacklist = [
+        "total", "subtotal", "tax", "gst", "sst", "vat", "cash", "change",
+        "invoice", "receipt", "thank", "date", "time", "table", "cashier",
+        "server", "rounding", "service", "summary", "amount", "balance",
+        "tel", "phone", "address",
+    ]
+    if any(k in low for k in blacklist): return True
+    if " rm " in f" {low} ": return True
+    return False
+
+
+def legacy_extract_candidate_item_lines(ocr_text, max_lines=25):
+    if not isinstance(ocr_text, str) or not ocr_text.strip():
+        return []
+    lines = [ln.strip() for ln in ocr_text.splitlines() if ln.strip()]
+    items = []
+    for ln in lines:
+        ln2 = re.sub(r"\s+\d{1,3}(?:,\d{3})*(?:\.\d{2})\s*$", "", ln.strip())
+        if legacy_looks_like_non_item(ln2):
+            continue
+        clean = legacy_normalize_text(ln2)
+        if clean and len(clean) >= 2:
+            items.append(clean)
+    seen, uniq = set(), []
+    for it in items:
+        if it not in seen:
+            uniq.append(it)
+            seen.add(it)
+    return uniq[:max_lines]
+
+
+def legacy_extract_candidate_items(lines):
+    candidates = []
+    blacklist = [
+        "total", "subtotal", "tax", "gst", "sst", "cash", "change",
+        "address", "tel", "phone", "invoice", "receipt", "date",
+        "time", "table", "cashier", "server", "pax", "sdn bhd", "jalan"
+    ]
+    date_pattern = r"\d{1,2}\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\s+\d{4}"
+    noise_pattern = r"(?:\d+-\w+)|(?:\d{10,})"
+    for line in lines:
+        line_low = line.lower()
+        if not any(k in line_low for k in blacklist):
+            if not re.search(date_pattern, line_low) and not re.search(noise_pattern, line_low):
+                if len(line) > 3 and any(c.isalpha() for c in line):
+                    clean_line = re.sub(r"\s+\d{1,3}(?:,\d{3})*(?:\.\d{2})\s*$", "", line)
+                    candidates.append(clean_line.strip())
+    return candidates
+
+
+# ---------------------------------------------------------------------------
+
+EDGE_LINES = [
+    "", " ", "a", "ab", "RM", "rm 5.00", "5.00 RM", "Milo RM", "RM12.50 sugar", "Total RM 12.50",
+    "12 Jan 2020 10:22", "12  jan  2020", "INV-00123", "0123456789012", "Tel: 03-1234 5678",
+    "SDN BHD", "sdn  bhd", "Jalan Ampang", "Fresh Milk 1L 6.90", "CHICKEN 1,234.50", "Item 12,34.5",
+    "Café Latté 9.90", "İstanbul Kebab 12.00", "ΣΟΥΒΛΑΚΙ 8.00", "Straße Brot 3.20", "Milk Tea 4.50",
+    "Ice Lemon Tea & Bun", "Bag/Plastic -0.20", "Coffee ２杯 7.00", "x", "1234", "a1b2", "Rounding Adj",
+    "Thank you!", "Servis 3%", "Paxton Bread", "SubTotal", "change due", "TIME 12:00", "**** MILO ****",
+    "Nasi Lemak\tRM5.00", "Teh O Ais\r", "Mee Goreng 5.00  ", "3 Sep 2019 Kopi", "Qty: 2 x 3.50",
+]
+
+
+def fuzz_lines(rng, count):
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,-&/:*#%$@\t éİΣß²"
+    words = [w for ln in EDGE_LINES for w in ln.split()] + list(line_filter.OCR_BLACKLIST) + ["rm", "jan", "2020"]
+    out = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            out.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 6))))
+        else:
+            out.append("".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))))
+    return out
+
+
+def load_ocr_lines(img_dir, limit=None):
+    names = sorted(f for f in os.listdir(img_dir) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    return [ocr_image(os.path.join(img_dir, n))[1] for n in names[:limit]]
+
+
+def check(receipts, extra_lines):
+    """Number of mismatches between the reference and line_filter, over every function."""
+    failures = 0
+    all_lines = [ln for r in receipts for ln in r] + extra_lines
+    for ln in all_lines:
+        if legacy_normalize_text(ln) != line_filter.normalize_text(ln):
+            failures += 1
+            print(f"normalize_text differs: {ln!r}")
+        if legacy_looks_like_non_item(ln) != line_filter.is_non_item(ln):
+            failures += 1
+            print(f"looks_like_non_item differs: {ln!r}")
+    if legacy_extract_candidate_items(all_lines) != line_filter.filter_item_lines(all_lines):
+        failures += 1
+        print("extract_candidate_items differs on the whole line list")
+    for group in receipts + [extra_lines[i:i + 20] for i in range(0, len(extra_lines), 20)]:
+        if legacy_extract_candidate_items(group) != line_filter.filter_item_lines(group):
+            failures += 1
+            print(f"extract_candidate_items differs: {group!r}")
+        text = "\n".join(group)
+        if legacy_extract_candidate_item_lines(text) != line_filter.candidate_item_lines(text):
+            failures += 1
+            print(f"extract_candidate_item_lines differs: {text!r}")
+    return failures, len(all_lines)
+
+
+def time_ms(fn, arg, repeat):
+    fn(arg)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--img-dir", default="train/img")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--check", action="store_true", help="Only run the golden comparison")
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    receipts = load_ocr_lines(args.img_dir, args.limit) if os.path.isdir(args.img_dir) else []
+    receipts = [r for r in receipts if r]
+    failures, checked = check(receipts, EDGE_LINES + fuzz_lines(rng, 5000))
+    if args.check:
+        print(f"{checked} lines from {len(receipts)} receipts checked, {failures} mismatches")
+        if not receipts:
+            print(f"no OCR output from {args.img_dir}: the golden check needs receipts")
+        sys.exit(1 if failures or not receipts else 0)
+
+    pool = [ln for r in receipts for ln in r] or fuzz_lines(rng, 1000)
+    rows = []
+    for count in args.lines:
+        lines = [rng.choice(pool) for _ in range(count)]
+        text = "\n".join(lines)
+        cases = [
+            ("extract_candidate_items", legacy_extract_candidate_items, line_filter.filter_item_lines, lines),
+            ("extract_candidate_item_lines", lambda t: legacy_extract_candidate_item_lines(t, count),
+             lambda t: line_filter.candidate_item_lines(t, count), text),
+            ("normalize_text", lambda ls: [legacy_normalize_text(x) for x in ls], line_filter.normalize_lines, lines),
+        ]
+        for name, old, new, arg in cases:
+            old_ms, new_ms = time_ms(old, arg, args.repeat), time_ms(new, arg, args.repeat)
+            rows.append({"function": name, "lines": count, "legacy_ms": round(old_ms, 3),
+                         "new_ms": round(new_ms, 3), "speedup": round(old_ms / new_ms, 2) if new_ms else None})
+
+    if args.json:
+        print(json.dumps({"golden_mismatches": failures, "results": rows}, indent=2))
+        return
+    print(f"golden check: {checked} lines, {failures} mismatches")
+    print(f"{'function':<30}{'lines':>7}{'legacy ms':>11}{'new ms':>9}{'speedup':>9}")
+    for r in rows:
+        print(f"{r['function']:<30}{r['lines']:>7}{r['legacy_ms']:>11}{r['new_ms']:>9}{r['speedup']:>8}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+OCR latency and extracted-total accuracy for each preprocessing profile.
+
+    python -m benchmarks.bench_ocr_preprocess
+    python -m benchmarks.bench_ocr_preprocess --img-dir train/img --entities path/to/sroie/entities
+
+With --entities (SROIE key files: <image id>.txt holding {"total": ...}) the
+extracted total is compared with the ground truth. Without it, "accuracy" is
+agreement with the "none" profile, i.e. with the current behaviour.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+
+from src.ocr_engine import ocr_image, extract_total
+from src.preprocess import PROFILES
+
+
+def norm_amount(value) -> str:
+    if value is None:
+        return ""
+    s = re.sub(r"[^\d.]", "", str(value))
+    try:
+        return f"{float(s):.2f}"
+    except ValueError:
+        return ""
+
+
+def load_truth(entities_dir: str, names):
+    truth = {}
+    for name in names:
+        path = os.path.join(entities_dir, os.path.splitext(name)[0] + ".txt")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                try:
+                    truth[name] = norm_amount(json.load(f).get("total"))
+                except json.JSONDecodeError:
+                    pass
+    return truth
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--img-dir", default="train/img")
+    parser.add_argument("--entities", default=None, help="SROIE entities directory with ground-truth totals")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.img_dir) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    names = names[:args.limit] if args.limit else names
+    truth = load_truth(args.entities, names) if args.entities else {}
+    reference = None
+
+    rows = []
+    for profile in args.profiles:
+        latencies, totals = [], {}
+        for name in names:
+            path = os.path.join(args.img_dir, name)
+            t0 = time.perf_counter()
+            _, lines = ocr_image(path, profile=profile)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            totals[name] = norm_amount(extract_total(lines))
+
+        if truth:
+            expected = truth
+        else:
+            if reference is None:
+                reference = totals if profile == "none" else {
+                    n: norm_amount(extract_total(ocr_image(os.path.join(args.img_dir, n), profile="none")[1]))
+                    for n in names
+                }
+            expected = reference
+        scored = [n for n in names if n in expected]
+        correct = sum(1 for n in scored if totals[n] and totals[n] == expected[n])
+        rows.append({
+            "profile": profile,
+            "images": len(names),
+            "p50_ms": round(statistics.median(latencies), 1),
+            "p95_ms": round(pct(latencies, 0.95), 1),
+            "total_s": round(sum(latencies) / 1000, 2),
+            "accuracy": round(correct / len(scored), 3) if scored else None,
+            "scored_against": "ground truth" if truth else "profile 'none'",
+        })
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'profile':<8}{'images':>7}{'p50 ms':>9}{'p95 ms':>9}{'total s':>9}{'accuracy':>10}  scored against")
+    for r in rows:
+        print(f"{r['profile']:<8}{r['images']:>7}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['total_s']:>9}"
+              f"{str(r['accuracy']):>10}  {r['scored_against']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Strip-parallel OCR (src/ocr_strips.py): wall-clock speedup against the number of strips and of worker threads.
+
+    python -m benchmarks.bench_ocr_strips
+    python -m benchmarks.bench_ocr_strips --images 8 --strips 2 4 8 --workers 1 2 4 --profile fast --json
+    python -m benchmarks.bench_ocr_strips --check          # stitched text against single-pass OCR, exit 1 on regression
+
+The tallest --images receipts of --img-dir are read in one piece (strips=0) and
+then with each --strips count on each --workers count of strip threads, OCR
+cache bypassed. Per setting: median seconds per receipt and speedup over the
+single pass; per strip count: how similar the stitched text is to the
+single-pass text (difflib character ratio) and how often extract_total agrees.
+The speedup is bounded by the cores available (printed), by the worker threads
+and by the OCR backend pool size, which this script raises to the largest
+worker count.
+
+--check reads every receipt of --img-dir tall enough for strips and compares
+each strip count with the single pass: receipts whose extract_total differs,
+single-pass lines missing from the stitched text and lines it repeats. Tesseract
+does not read a crop exactly like the whole page, so the reference is the whole
+image read through the strip path as one strip: a strip count fails when it
+differs on more totals than that, misses more than --missing-tolerance or repeats
+more than --repeated-tolerance of the single-pass lines beyond it. Repeats come
+from stitching only, missing lines mostly from Tesseract laying out a strip
+differently from the whole page.
+"""
+import os
+
+# Before the OCR modules are imported: one OpenMP thread per Tesseract call
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from difflib import SequenceMatcher
+
+from PIL import Image
+
+
+def tallest(img_dir: str, count: int):
+    from src.batch_pipeline import list_images
+
+    sized = [(Image.open(p).height, p) for p in list_images(img_dir)]
+    return [p for _, p in sorted(sized, reverse=True)[:count]]
+
+
+def compare_lines(single, stitched):
+    """(single-pass lines not found in stitched, stitched lines repeating an already matched line)."""
+    from src.ocr_strips import _same_line
+
+    rest, missing = list(stitched), 0
+    for line in single:
+        for i, other in enumerate(rest):
+            if _same_line(line, other):
+                del rest[i]
+                break
+        else:
+            missing += 1
+    repeated = sum(any(_same_line(other, line) for line in single) for other in rest)
+    return missing, repeated
+
+
+def check(img_dir, counts, profile, missing_tolerance, repeated_tolerance):
+    """Rows of the --check table, and whether every strip count passed."""
+    from src import ocr_strips
+    from src.batch_pipeline import list_images
+    from src.ocr_backends import get_ocr_backend
+    from src.ocr_engine import extract_total, ocr_image
+    from src.preprocess import preprocess_image
+
+    backend = get_ocr_backend()
+    receipts = []
+    for path in list_images(img_dir):
+        img = preprocess_image(Image.open(path), profile)
+        if not ocr_strips.use_strips(img, max(counts)):
+            continue
+        single = ocr_image(path, profile=profile, use_cache=False, strips=0)[1]
+        stitched = {1: ocr_strips.ocr_strips(img, backend, 1).split("\n")}
+        for k in counts:
+            stitched[k] = ocr_image(path, profile=profile, use_cache=False, strips=k)[1]
+        receipts.append((os.path.basename(path), single, stitched))
+
+    n_lines = sum(len(single) for _, single, _ in receipts)
+    rows = []
+    for k in [1] + counts:
+        row = {"strips": k, "totals_differ": 0, "missing_lines": 0, "repeated_lines": 0}
+        for name, single, stitched in receipts:
+            missing, repeated = compare_lines(single, stitched[k])
+            row["missing_lines"] += missing
+            row["repeated_lines"] += repeated
+            if extract_total(single) != extract_total(stitched[k]):
+                row["totals_differ"] += 1
+                if k > 1:
+                    print(f"{name} strips={k}: total {extract_total(stitched[k])} instead of {extract_total(single)}",
+                          file=sys.stderr)
+        rows.append(row)
+
+    ref = rows[0]
+    ok = bool(receipts)
+    for row in rows[1:]:
+        row["ok"] = (row["totals_differ"] <= ref["totals_differ"]
+                     and row["missing_lines"] <= ref["missing_lines"] + missing_tolerance * n_lines
+                     and row["repeated_lines"] <= ref["repeated_lines"] + repeated_tolerance * n_lines)
+        ok = ok and row["ok"]
+    return {"receipts": len(receipts), "single_pass_lines": n_lines, "results": rows}, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--img-dir", default="train/img")
+    parser.add_argument("--images", type=int, default=6, help="Tallest receipts to use")
+    parser.add_argument("--strips", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                        help="Strip thread pool sizes (SSCA_OCR_STRIP_WORKERS)")
+    parser.add_argument("--profile", default=None, help="Preprocessing profile (default: SSCA_OCR_PREPROCESS)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="Only compare the stitched text with a single pass")
+    parser.add_argument("--missing-tolerance", type=float, default=0.04,
+                        help="--check: share of the single-pass lines that may be missing beyond the reference")
+    parser.add_argument("--repeated-tolerance", type=float, default=0.01,
+                        help="--check: share of the single-pass lines that may be repeated beyond the reference")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    counts = sorted({k for k in args.strips if k > 1})
+    workers = sorted({w for w in args.workers if w > 0})
+    if not counts or not workers:
+        parser.error("--strips needs a count above 1 and --workers a count above 0")
+    # Enough tesserocr engines for the largest worker count
+    os.environ.setdefault("SSCA_OCR_POOL_SIZE", str(max(workers)))
+    from src import ocr_backends, ocr_strips
+    from src.ocr_engine import extract_total, ocr_image
+
+    if args.check:
+        result, ok = check(args.img_dir, counts, args.profile, args.missing_tolerance, args.repeated_tolerance)
+        if args.json:
+            print(json.dumps(dict(result, ok=ok), indent=2))
+        else:
+            print(f"{result['receipts']} receipts tall enough for strips, {result['single_pass_lines']} "
+                  f"single-pass lines, tolerance {args.missing_tolerance:.0%} missing / "
+                  f"{args.repeated_tolerance:.0%} repeated")
+            print(f"{'strips':>6}{'totals differ':>15}{'missing lines':>15}{'repeated lines':>16}")
+            for r in result["results"]:
+                status = "" if "ok" not in r else ("  ok" if r["ok"] else "  FAIL")
+                print(f"{r['strips']:>6}{r['totals_differ']:>15}{r['missing_lines']:>15}"
+                      f"{r['repeated_lines']:>16}{status}")
+            if not result["receipts"]:
+                print(f"no receipt of {args.img_dir} is tall enough for strips")
+        sys.exit(0 if ok else 1)
+
+    paths = tallest(args.img_dir, args.images)
+    if not paths:
+        parser.error(f"no images in {args.img_dir}")
+    ocr_backends.get_ocr_backend()
+    # Warm-up: engines created, first-call costs paid
+    ocr_strips.set_strip_workers(max(workers))
+    ocr_image(paths[0], profile=args.profile, use_cache=False, strips=max(counts))
+
+    def run(strips):
+        samples, outputs = [], []
+        for path in paths:
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                out = ocr_image(path, profile=args.profile, use_cache=False, strips=strips)
+                times.append(time.perf_counter() - t0)
+            samples.append(statistics.median(times))
+            outputs.append(out)
+        return samples, outputs
+
+    base_s, base_out = run(0)
+    base_total = sum(base_s)
+    rows = [{"strips": 1, "workers": 1, "s_per_receipt": round(statistics.median(base_s), 3), "speedup": 1.0,
+             "text_similarity": 1.0, "total_agreement": 1.0}]
+    for k in counts:
+        for w in workers:
+            ocr_strips.set_strip_workers(w)
+            s, out = run(k)
+            similarity = [SequenceMatcher(None, b[0], o[0]).ratio() for b, o in zip(base_out, out)]
+            totals = [extract_total(b[1]) == extract_total(o[1]) for b, o in zip(base_out, out)]
+            rows.append({
+                "strips": k,
+                "workers": w,
+                "s_per_receipt": round(statistics.median(s), 3),
+                "speedup": round(base_total / sum(s), 2),
+                "text_similarity": round(statistics.fmean(similarity), 3),
+                "total_agreement": round(sum(totals) / len(totals), 3),
+            })
+
+    result = {
+        "cpu_count": os.cpu_count(),
+        "backend": ocr_backends.current_backend_name(),
+        "images": [f"{os.path.basename(p)} ({Image.open(p).width}x{Image.open(p).height})" for p in paths],
+        "results": rows,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{len(paths)} receipts, backend={result['backend']}, cpus={result['cpu_count']}, "
+              f"python {sys.version.split()[0]}")
+        print(f"{'strips':>6}{'workers':>9}{'s/receipt':>11}{'speedup':>9}{'text sim':>10}{'total ok':>10}")
+        for r in rows:
+            print(f"{r['strips']:>6}{r['workers']:>9}{r['s_per_receipt']:>11}{r['speedup']:>9}"
+                  f"{r['text_similarity']:>10}{r['total_agreement']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for predict_items: latency against line count and line length.
+
+Compares the old single padded batch (padding=True, truncation to 512) with the
+length-bucketed, chunked path.
+
+    python -m benchmarks.bench_predict_items
+    python -m benchmarks.bench_predict_items --counts 5 25 200 --repeat 5 --json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+
+from src import nlp_engine
+from src.nlp_engine import classify_probs, get_classifier, normalize_text
+
+
+SHORT_ITEMS = [
+    "milo", "plastic bag", "fresh milk", "chicken wing", "mineral water",
+    "dishwashing liquid", "chocolate bar", "white bread", "coca cola", "tissue",
+]
+
+
+def make_lines(count: int, kind: str, rng: random.Random):
+    if kind == "short":
+        return [rng.choice(SHORT_ITEMS) for _ in range(count)]
+    if kind == "long":
+        return [" ".join(rng.choice(SHORT_ITEMS) for _ in range(40)) for _ in range(count)]
+    # "mixed": receipt-like short lines plus one long OCR garbage line
+    lines = [rng.choice(SHORT_ITEMS) for _ in range(max(count - 1, 0))]
+    lines.append(" ".join(rng.choice(SHORT_ITEMS) for _ in range(150)))
+    return lines
+
+
+def legacy_probs(cleaned):
+    """The pre-bucketing path: one batch padded to its longest line (up to 512 positions)."""
+    tok, backend = get_classifier()
+    enc = dict(tok(cleaned, padding=True, truncation=True, return_tensors="np"))
+    return backend(enc)
+
+
+def time_ms(fn, lines, repeat):
+    fn(lines)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(lines)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 5, 25, 100, 500])
+    parser.add_argument("--kinds", nargs="+", default=["short", "mixed", "long"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable rows")
+    args = parser.parse_args()
+
+    get_classifier()
+    rng = random.Random(0)
+    rows = []
+    for kind in args.kinds:
+        for count in args.counts:
+            cleaned = [normalize_text(x) for x in make_lines(count, kind, rng)]
+            legacy = time_ms(legacy_probs, cleaned, args.repeat)
+            bucketed = time_ms(classify_probs, cleaned, args.repeat)
+            same = bool(np.array_equal(legacy_probs(cleaned).argmax(-1), classify_probs(cleaned).argmax(-1)))
+            rows.append({
+                "kind": kind, "lines": count, "legacy_ms": round(legacy, 2),
+                "bucketed_ms": round(bucketed, 2), "speedup": round(legacy / bucketed, 2),
+                "same_labels": same,
+            })
+
+    if args.json:
+        print(json.dumps({"max_length": nlp_engine.MAX_LENGTH,
+                          "batch_size": nlp_engine.INFER_BATCH_SIZE, "rows": rows}, indent=2))
+        return
+
+    print(f"max_length={nlp_engine.MAX_LENGTH} batch_size={nlp_engine.INFER_BATCH_SIZE}")
+    print(f"{'kind':<7}{'lines':>7}{'legacy ms':>12}{'bucketed ms':>14}{'speedup':>9}  same labels")
+    for r in rows:
+        print(f"{r['kind']:<7}{r['lines']:>7}{r['legacy_ms']:>12}{r['bucketed_ms']:>14}{r['speedup']:>9}  {r['same_labels']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Prompt tokens, completion tokens, cost and latency of the "raw" and "compact" prompt modes.
+
+    python -m benchmarks.bench_prompt_modes --img-dir train/img --limit 20
+    python -m src.llm_stub_server --port 8089 &      # offline: point SSCA_LLM_BASE_URL at the stub
+    SSCA_LLM_BASE_URL=http://127.0.0.1:8089/v1 HF_TOKEN=stub python -m benchmarks.bench_prompt_modes
+
+Reports are requested with the cache disabled so every call reaches the endpoint.
+--check makes no call: it only verifies that categories supplied for the
+normalized item lines (as the service and the cascade pass them) reach the
+compact prompt, and exits 1 otherwise.
+"""
+import argparse
+import json
+import os
+import sys
+
+from src.line_filter import normalize_text, strip_trailing_price
+from src.llm_engine import LLM_PROMPT_MODES, TOKEN_STATS, compact_receipt_payload, get_eco_report_from_deepseek
+from src.ocr_engine import ocr_image
+
+
+def check_compact_categories(texts):
+    """(rows checked, rows whose supplied category did not reach the compact payload)."""
+    from src.nlp_engine import LABELS, extract_candidate_item_lines
+
+    checked, missing = 0, 0
+    for text in texts:
+        # A distinct, non-'other' label per normalized line, so a failed join shows up
+        labels = [lab for lab in LABELS if lab != "other"]
+        expected = {ln: labels[i % len(labels)] for i, ln in enumerate(extract_candidate_item_lines(text))}
+        preds = [{"line": ln, "clean": ln, "category": cat, "confidence": 1.0} for ln, cat in expected.items()]
+        for row in compact_receipt_payload(text, preds).splitlines()[2:]:
+            line, _, category = row[2:].rpartition(" | ")
+            want = expected.get(normalize_text(strip_trailing_price(line)))
+            if want is None:
+                continue  # kept by the OCR item filter but not an NLP candidate line
+            checked += 1
+            if category != want:
+                missing += 1
+                print(f"category lost in the compact prompt: {line!r} -> {category!r}, expected {want!r}")
+    return checked, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--img-dir", default="train/img")
+    parser.add_argument("--modes", nargs="+", default=list(LLM_PROMPT_MODES))
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--check", action="store_true", help="Only check the compact prompt categories")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.img_dir) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    texts = [ocr_image(os.path.join(args.img_dir, n))[0] for n in names[:args.limit]]
+    if args.check:
+        checked, missing = check_compact_categories(texts)
+        print(f"{checked} item rows from {len(texts)} receipts checked, {missing} lost categories")
+        sys.exit(1 if missing or not checked else 0)
+
+    errors = {}
+    for mode in args.modes:
+        reports = [get_eco_report_from_deepseek(t, use_cache=False, prompt_mode=mode) for t in texts]
+        errors[mode] = sum(1 for r in reports if "error" in r)
+
+    rows = []
+    for mode in args.modes:
+        s = TOKEN_STATS.get(mode, {})
+        calls = s.get("calls") or 1
+        rows.append({
+            "mode": mode,
+            "receipts": len(texts),
+            "errors": errors[mode],
+            "prompt_tokens_avg": round(s.get("prompt_tokens", 0) / calls, 1),
+            "completion_tokens_avg": round(s.get("completion_tokens", 0) / calls, 1),
+            "cost_usd_per_receipt": round(s.get("cost_usd", 0.0) / calls, 6),
+            "latency_s_avg": round(s.get("latency_s", 0.0) / calls, 3),
+        })
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'mode':<9}{'n':>4}{'err':>5}{'prompt tok':>12}{'compl tok':>11}{'$/receipt':>12}{'latency s':>11}")
+    for r in rows:
+        print(f"{r['mode']:<9}{r['receipts']:>4}{r['errors']:>5}{r['prompt_tokens_avg']:>12}"
+              f"{r['completion_tokens_avg']:>11}{r['cost_usd_per_receipt']:>12.6f}{r['latency_s_avg']:>11}")
+
+
+if __name__ == "__main__":
+    main()
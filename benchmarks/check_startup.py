@@ -0,0 +1,94 @@
+"""
+Startup budget check: import time of the app's modules and seconds to first paint.
+
+    python -m benchmarks.check_startup
+    python -m benchmarks.check_startup --import-budget 1.0 --paint-budget 2.5 --json
+
+Each measurement runs in a fresh interpreter. The check fails (exit 1) when
+importing what app.py imports takes longer than --import-budget, when it loads
+one of HEAVY_MODULES (they must stay lazy), or when the first Streamlit run of
+app.py (no receipt selected yet) takes longer than --paint-budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_IMPORTS = ["streamlit", "src.tracing", "src.ocr_engine", "src.llm_engine", "src.nlp_engine",
+               "src.cascade", "src.history_store"]
+# Must not be imported before the first OCR / classification / LLM call
+HEAVY_MODULES = ["torch", "transformers", "openai", "pytesseract", "tesserocr", "onnxruntime", "pandas"]
+
+IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+PAINT_PROBE = """
+import json, time
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+print(json.dumps({{"seconds": time.perf_counter() - t0, "exceptions": [str(e.value) for e in at.exception]}}))
+"""
+
+
+def run_probe(code: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import-budget", type=float, default=float(os.environ.get("SSCA_IMPORT_BUDGET_S", "1.5")))
+    parser.add_argument("--paint-budget", type=float, default=float(os.environ.get("SSCA_PAINT_BUDGET_S", "3.0")))
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per measurement (median)")
+    parser.add_argument("--skip-paint", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    imports = [run_probe(IMPORT_PROBE.format(modules=APP_IMPORTS, heavy=HEAVY_MODULES)) for _ in range(args.repeat)]
+    result = {
+        "import_s": round(statistics.median(r["seconds"] for r in imports), 3),
+        "import_budget_s": args.import_budget,
+        "heavy_modules_loaded": sorted({m for r in imports for m in r["heavy"]}),
+    }
+    if not args.skip_paint:
+        paints = [run_probe(PAINT_PROBE.format(app=os.path.join(ROOT, "app.py"))) for _ in range(args.repeat)]
+        result["first_paint_s"] = round(statistics.median(r["seconds"] for r in paints), 3)
+        result["paint_budget_s"] = args.paint_budget
+        result["app_exceptions"] = sorted({e for r in paints for e in r["exceptions"]})
+
+    failures = []
+    if result["import_s"] > args.import_budget:
+        failures.append(f"imports took {result['import_s']}s, budget {args.import_budget}s")
+    if result["heavy_modules_loaded"]:
+        failures.append(f"heavy modules loaded at import: {', '.join(result['heavy_modules_loaded'])}")
+    if result.get("first_paint_s", 0) > args.paint_budget:
+        failures.append(f"first paint took {result['first_paint_s']}s, budget {args.paint_budget}s")
+    if result.get("app_exceptions"):
+        failures.append(f"app raised: {result['app_exceptions']}")
+    result["failures"] = failures
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"imports: {result['import_s']}s (budget {args.import_budget}s)")
+        if "first_paint_s" in result:
+            print(f"first paint: {result['first_paint_s']}s (budget {args.paint_budget}s)")
+        for f in failures:
+            print("FAIL " + f)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Headless batch processing of a directory of receipt images.
+
+    python -m src.batch_pipeline train/img --out results.jsonl
+    python -m src.batch_pipeline train/img --out results.jsonl --llm --llm-concurrency 4
+    python -m src.batch_pipeline train/img --out results.jsonl --history
+    python -m src.batch_pipeline train/img --out results.jsonl --llm-escalated
+
+Classification goes through the lexicon -> model cascade (src/cascade.py); with
+--llm-escalated only receipts below the confidence threshold get an LLM report.
+
+Stages are connected by bounded queues so a slow stage holds back the ones
+before it instead of buffering the whole directory in memory:
+
+    images -> OCR (process pool) -> classification (batched) -> [LLM report] -> JSONL writer [+ history]
+
+Each finished receipt is appended to the output file straight away, and a rerun
+with the same --out skips images that already have a successful record; their
+failed records are removed from the file before they are processed again.
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Set
+
+from src.ocr_engine import ocr_image, extract_total, extract_candidate_items
+
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+_DONE = object()
+
+
+def list_images(img_dir: str) -> List[str]:
+    names = sorted(f for f in os.listdir(img_dir) if f.lower().endswith(IMAGE_EXTS))
+    return [os.path.join(img_dir, f) for f in names]
+
+
+def load_done(out_path: str, drop_failed: bool = False) -> Set[str]:
+    """
+    Images that already have a successful record in the output file.
+    With drop_failed=True the file is rewritten without the other records (errors,
+    a truncated last line), since those images are processed again on resume.
+    """
+    done, kept, dropped = set(), [], 0
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                dropped += 1  # truncated last line after a crash
+                continue
+            report = rec.get("report")
+            if "error" not in rec and not (isinstance(report, dict) and "error" in report):
+                done.add(rec.get("image"))
+                kept.append(line if line.endswith("\n") else line + "\n")
+            else:
+                dropped += 1
+    if drop_failed and dropped:
+        tmp = out_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+        os.replace(tmp, out_path)
+    return done
+
+
+class _Pipe(queue.Queue):
+    """Queue between two stages; remembers whether the end marker was taken."""
+
+    closed = False
+
+    def get(self, *args, **kwargs):
+        item = super().get(*args, **kwargs)
+        if item is _DONE:
+            self.closed = True
+        return item
+
+    def drain(self):
+        """Discard the rest of the input, so the stages feeding a failed one are not blocked."""
+        while not self.closed:
+            self.get()
+
+
+def ocr_task(path: str) -> Dict:
+    """Runs in a worker process."""
+    t0 = time.perf_counter()
+    try:
+        text, lines = ocr_image(path)
+        return {
+            "image": os.path.basename(path),
+            "path": path,
+            "text": text,
+            "total": extract_total(lines),
+            "items": extract_candidate_items(lines),
+            "timings": {"ocr_s": round(time.perf_counter() - t0, 3)},
+        }
+    except Exception as e:
+        return {"image": os.path.basename(path), "path": path, "error": f"OCR failed: {e}"}
+
+
+def ocr_bytes_task(data: bytes) -> Dict:
+    """
+    Runs in a worker process; ocr_task for an image received in memory.
+    The tracing spans recorded here are returned in "spans", for tracing.record_spans in the caller.
+    """
+    from src import tracing
+
+    with tracing.capture() as spans:
+        result = _ocr_bytes(data)
+    if spans:
+        result["spans"] = [sp.to_dict() for sp in spans]
+    return result
+
+
+def _ocr_bytes(data: bytes) -> Dict:
+    from PIL import Image
+
+    t0 = time.perf_counter()
+    try:
+        Image.open(io.BytesIO(data)).verify()
+    except Exception:
+        return {"error": "Unreadable image, expected JPEG or PNG bytes"}
+    try:
+        text, lines = ocr_image(data)
+        return {
+            "text": text,
+            "total": extract_total(lines),
+            "items": extract_candidate_items(lines),
+            "timings": {"ocr_s": round(time.perf_counter() - t0, 3)},
+        }
+    except Exception as e:
+        return {"error": f"OCR failed: {e}"}
+
+
+def warm_ocr_worker() -> str:
+    """Runs in a worker process: create the OCR engine before the first image arrives."""
+    from src.ocr_backends import get_ocr_backend
+
+    return get_ocr_backend().name
+
+
+class BatchPipeline:
+    def __init__(self, out_path: str, ocr_workers: int = None, batch_size: int = 8,
+                 use_llm: bool = False, llm_concurrency: int = 4, queue_size: int = 16, history=None,
+                 llm_escalated_only: bool = False):
+        self.out_path = out_path
+        self.ocr_workers = ocr_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.use_llm = use_llm or llm_escalated_only
+        self.llm_escalated_only = llm_escalated_only
+        self.llm_concurrency = llm_concurrency
+        self.queue_size = queue_size
+        self.history = history  # src.history_store.HistoryStore, or None
+        self.stats = {"processed": 0, "errors": 0, "skipped": 0}
+
+    def _stage(self, name: str, target, inp, out, *args):
+        """
+        Run one stage in its thread. Whatever happens, the next stage gets _DONE;
+        if the stage fails, its input is drained and the error goes to stats["stage_errors"].
+        """
+        try:
+            target(*args)
+        except Exception as e:
+            self.stats.setdefault("stage_errors", []).append(f"{name}: {e}")
+            if inp is not None:
+                inp.drain()
+        finally:
+            if out is not None:
+                out.put(_DONE)
+
+    # --- stage 1: OCR in a process pool ---
+    def _feed_ocr(self, pool, paths: Iterable[str], futures: queue.Queue):
+        for path in paths:
+            futures.put((path, pool.submit(ocr_task, path)))  # blocks when too many are in flight
+
+    def _collect_ocr(self, futures: queue.Queue, out: queue.Queue):
+        while True:
+            entry = futures.get()
+            if entry is _DONE:
+                break
+            path, fut = entry
+            try:
+                out.put(fut.result())
+            except Exception as e:  # e.g. a crashed worker process
+                out.put({"image": os.path.basename(path), "path": path, "error": f"OCR failed: {e}"})
+
+    # --- stage 2: classification, several receipts per model call ---
+    def _classify(self, inp: queue.Queue, out: queue.Queue):
+        from src.cascade import STATS, needs_llm, predict_items_cascade, receipt_confidence
+        from src.nlp_engine import extract_candidate_item_lines
+
+        finished = False
+        while not finished:
+            batch = []
+            while len(batch) < self.batch_size:
+                # Wait for the first receipt, then only take what is already queued
+                try:
+                    rec = inp.get(timeout=None if not batch else 0.05)
+                except queue.Empty:
+                    break
+                if rec is _DONE:
+                    finished = True
+                    break
+                batch.append(rec)
+            if not batch:
+                continue
+
+            ok = [r for r in batch if "error" not in r]
+            per_receipt = [extract_candidate_item_lines(r["text"]) for r in ok]
+            flat = [ln for lines in per_receipt for ln in lines]
+            t0 = time.perf_counter()
+            try:
+                preds = predict_items_cascade(flat) if flat else []
+            except Exception as e:
+                preds = None
+                for r in ok:
+                    r["error"] = f"Classification failed: {e}"
+            elapsed = round(time.perf_counter() - t0, 3)
+
+            offset = 0
+            for r, lines in zip(ok, per_receipt):
+                if preds is not None:
+                    r["predictions"] = preds[offset:offset + len(lines)]
+                    r["confidence"] = round(receipt_confidence(r["predictions"]), 4)
+                    r["escalate"] = needs_llm(r["predictions"])
+                    STATS.add_receipt(r["escalate"])
+                    r["timings"]["classify_batch_s"] = elapsed
+                offset += len(lines)
+            for r in batch:
+                out.put(r)
+
+    # --- stage 3: optional LLM report with bounded concurrency ---
+    def _llm(self, inp: queue.Queue, out: queue.Queue):
+        asyncio.run(self._llm_async(inp, out))
+
+    async def _llm_async(self, inp: queue.Queue, out: queue.Queue):
+        from src.cascade import STATS
+        from src.llm_client import AsyncLLMClient
+
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(self.llm_concurrency)
+        tasks = set()
+        llm = AsyncLLMClient(api_key=self._api_key, concurrency=self.llm_concurrency)
+
+        async def report(rec):
+            try:
+                if "error" not in rec and (rec.get("escalate") or not self.llm_escalated_only):
+                    STATS.add_llm_call()
+                    t0 = time.perf_counter()
+                    rec["report"] = await llm.eco_report(rec["text"])
+                    rec["timings"]["llm_s"] = round(time.perf_counter() - t0, 3)
+                    if "error" in rec["report"]:
+                        rec["error"] = f"LLM failed: {rec['report']['error']}"  # retried on the next run
+            except Exception as e:
+                rec["error"] = f"LLM failed: {e}"
+            finally:
+                sem.release()
+            await loop.run_in_executor(None, out.put, rec)
+
+        try:
+            while True:
+                rec = await loop.run_in_executor(None, inp.get)
+                if rec is _DONE:
+                    break
+                await sem.acquire()  # backpressure: at most llm_concurrency calls in flight
+                task = asyncio.create_task(report(rec))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            await llm.aclose()
+
+    # --- sink: append JSONL as results arrive ---
+    def _write(self, inp: queue.Queue):
+        with open(self.out_path, "a", encoding="utf-8") as f:
+            while True:
+                rec = inp.get()
+                if rec is _DONE:
+                    break
+                rec.pop("path", None)
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                f.flush()
+                if self.history is not None and "error" not in rec:
+                    self.history.record_receipt(rec["text"], rec.get("predictions"), rec.get("total"),
+                                                report=rec.get("report"))
+                self.stats["errors" if "error" in rec else "processed"] += 1
+
+    def run(self, paths: List[str]) -> Dict:
+        done = load_done(self.out_path, drop_failed=True)
+        todo = [p for p in paths if os.path.basename(p) not in done]
+        self.stats["skipped"] = len(paths) - len(todo)
+        if self.use_llm:
+            # Resolve the key up front so a missing one fails before any worker starts
+            from src.llm_engine import get_api_key
+            self._api_key = get_api_key()
+
+        q_futures = _Pipe(maxsize=self.ocr_workers * 2)
+        q_ocr = _Pipe(maxsize=self.queue_size)
+        q_cls = _Pipe(maxsize=self.queue_size)
+        q_out = _Pipe(maxsize=self.queue_size) if self.use_llm else q_cls
+
+        stages = [
+            ("ocr_feed", lambda: self._feed_ocr(pool, todo, q_futures), None, q_futures),
+            ("ocr", lambda: self._collect_ocr(q_futures, q_ocr), q_futures, q_ocr),
+            ("classify", lambda: self._classify(q_ocr, q_cls), q_ocr, q_cls),
+            ("write", lambda: self._write(q_out), q_out, None),
+        ]
+        if self.use_llm:
+            stages.append(("llm", lambda: self._llm(q_cls, q_out), q_cls, q_out))
+
+        t0 = time.perf_counter()
+        # spawn: the stage threads are already running when the pool starts its workers
+        with ProcessPoolExecutor(max_workers=self.ocr_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            threads = [threading.Thread(target=self._stage, args=stage) for stage in stages]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        elapsed = time.perf_counter() - t0
+        self.stats["elapsed_s"] = round(elapsed, 2)
+        self.stats["receipts_per_s"] = round(len(todo) / elapsed, 2) if elapsed else 0.0
+        from src.cascade import cascade_stats
+        self.stats["tiers"] = cascade_stats()
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("img_dir", help="Directory of receipt images (jpg/png)")
+    parser.add_argument("--out", default="results.jsonl", help="JSONL output, also used to resume")
+    parser.add_argument("--ocr-workers", type=int, default=None, help="OCR processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Receipts per classification call")
+    parser.add_argument("--llm", action="store_true", help="Also generate the DeepSeek eco-report")
+    parser.add_argument("--llm-escalated", action="store_true",
+                        help="Generate the report only for receipts below the confidence threshold")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=16, help="Bound of the queues between stages")
+    parser.add_argument("--history", action="store_true", help="Also append the results to SSCA_HISTORY_DB")
+    args = parser.parse_args()
+
+    history = None
+    if args.history:
+        from src.history_store import get_history
+        history = get_history()
+        if history is None:
+            parser.error("--history needs SSCA_HISTORY_DB to be set")
+
+    pipeline = BatchPipeline(
+        args.out, ocr_workers=args.ocr_workers, batch_size=args.batch_size, use_llm=args.llm,
+        llm_concurrency=args.llm_concurrency, queue_size=args.queue_size, history=history,
+        llm_escalated_only=args.llm_escalated,
+    )
+    stats = pipeline.run(list_images(args.img_dir))
+    print(json.dumps(stats))
+    if stats.get("stage_errors"):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with an optional time-to-live per entry."""
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Small persistent key/value table: (namespace, key) -> JSON value.
+    The namespace carries whatever invalidates the entries (model checksum, engine config, ...).
+    """
+
+    def __init__(self, path: str, table: str = "cache"):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        # timeout: several processes may share one cache file
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (ns, key))"
+            )
+
+    def get(self, ns: str, key: str, max_age: Optional[float] = None):
+        return self.get_many(ns, [key], max_age).get(key)
+
+    def get_many(self, ns: str, keys: Iterable[str], max_age: Optional[float] = None) -> Dict[str, Any]:
+        keys = list(keys)
+        found = {}
+        oldest = time.time() - max_age if max_age is not None else None
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look keys up in slices
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created FROM {self.table} WHERE ns = ? AND key IN ({marks})",
+                    [ns, *part],
+                ).fetchall()
+                for key, value, created in rows:
+                    if oldest is None or created >= oldest:
+                        found[key] = json.loads(value)
+        return found
+
+    def put(self, ns: str, key: str, value):
+        self.put_many(ns, [(key, value)])
+
+    def put_many(self, ns: str, items: List[Tuple[str, Any]]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (ns, key, value, created) VALUES (?, ?, ?, ?)",
+                [(ns, k, json.dumps(v), now) for k, v in items],
+            )
+
+    def delete_other_namespaces(self, ns: str) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM {self.table} WHERE ns != ?", (ns,)).rowcount
+
+    def delete_older_than(self, max_age: float) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created < ?", (time.time() - max_age,)
+            ).rowcount
+
+    def trim(self, max_rows: int) -> int:
+        """Keep only the max_rows most recent entries."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"DELETE FROM {self.table} WHERE rowid NOT IN "
+                f"(SELECT rowid FROM {self.table} ORDER BY created DESC LIMIT ?)",
+                (max_rows,),
+            ).rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,342 @@
+"""
+Tiered receipt classification: item lexicon -> DistilBERT -> LLM report.
+
+    result = classify_receipt(ocr_text)        # tiers 1 and 2 plus the escalation decision
+    result = analyze_receipt(ocr_text)         # also asks the LLM when the receipt is escalated
+
+Tier 1  the normalized line is looked up in a lexicon of frequent item names
+        (a JSON file, SSCA_LEXICON_PATH). No tokenizer, no model call.
+Tier 2  lines the lexicon does not know go to predict_items (DistilBERT, cached).
+Tier 3  only receipts whose confidence, the mean line confidence, is below
+        LLM_ESCALATION_THRESHOLD (the 0.45 'other' threshold by default) get the
+        DeepSeek report; the others are answered locally.
+
+The lexicon is built from the model's own confident predictions on the names
+that occur most often in a set of receipts, so a lexicon hit gives the same
+label the model would:
+
+    python -m src.cascade build train/img --min-count 2 --min-confidence 0.9
+    python -m src.cascade build results.jsonl        # texts from src.batch_pipeline
+    python -m src.cascade stats train/img            # tier hit rates over a directory
+
+Without a lexicon every line goes to the model. The file records the
+fingerprint of the model it was built with (a digest of the model files'
+contents, see nlp_engine.model_fingerprint) and is ignored once the model
+changes, so it has to be rebuilt after every model update. lexicon_status()
+tells whether it was ignored, for the app and the service to show.
+
+cascade_stats() reports each tier's hit rate, the model time and the LLM calls.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from src import line_filter, tracing
+from src.nlp_engine import (LABELS, extract_candidate_item_lines, model_checksum, model_fingerprint, predict_items,
+                             predict_items_batched)
+
+
+LEXICON_PATH = os.environ.get(
+    "SSCA_LEXICON_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "item_lexicon.json"),
+)
+# Per-line 'other' threshold of predict_items, and the receipt confidence below which the LLM is asked
+LINE_THRESHOLD = 0.45
+LLM_ESCALATION_THRESHOLD = float(os.environ.get("SSCA_LLM_ESCALATION_THRESHOLD", str(LINE_THRESHOLD)))
+
+logger = logging.getLogger(__name__)
+
+
+class ItemLexicon:
+    """Normalized item name -> (label, confidence), loaded once from a JSON file."""
+
+    def __init__(self, entries: Optional[Dict[str, tuple]] = None, path: Optional[str] = None,
+                 invalid_reason: Optional[str] = None):
+        self.entries = entries or {}
+        self.path = path
+        # Why the file was ignored, None when it was loaded (or does not exist)
+        self.invalid_reason = invalid_reason
+
+    @classmethod
+    def load(cls, path: str, fingerprint: Optional[str] = None) -> "ItemLexicon":
+        """
+        An empty lexicon when the file is missing, or when it was built with another
+        model than `fingerprint` (its labels would no longer be the model's).
+        Files written before the fingerprint are checked against model_checksum.
+        """
+        if not path or not os.path.exists(path):
+            return cls(path=path)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if "model_fingerprint" in data:
+            built_with, current = data["model_fingerprint"], fingerprint
+        else:
+            built_with, current = data.get("model_checksum"), model_checksum()
+        if current and built_with and built_with != current:
+            reason = (f"built for model {built_with[:12]}, current model is {current[:12]}; "
+                      f"rebuild it with python -m src.cascade build")
+            logger.warning("Ignoring item lexicon %s: %s.", path, reason)
+            return cls(path=path, invalid_reason=reason)
+        entries = {name: (label, float(conf)) for name, (label, conf, *_) in data.get("entries", {}).items()
+                   if label in LABELS}
+        return cls(entries, path)
+
+    def save(self, path: str, counts: Optional[Counter] = None, meta: Optional[Dict] = None):
+        counts = counts or Counter()
+        data = {
+            **(meta or {}),
+            "entries": {name: [label, round(conf, 4), counts.get(name, 0)]
+                        for name, (label, conf) in sorted(self.entries.items())},
+        }
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+    def get(self, name: str):
+        return self.entries.get(name)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_LEXICON = None
+_LEXICON_LOCK = threading.Lock()
+
+
+def get_lexicon() -> ItemLexicon:
+    global _LEXICON
+    if _LEXICON is None:
+        with _LEXICON_LOCK:
+            if _LEXICON is None:
+                _LEXICON = ItemLexicon.load(LEXICON_PATH, model_fingerprint())
+    return _LEXICON
+
+
+def reload_lexicon(path: Optional[str] = None) -> ItemLexicon:
+    """Read the lexicon file again (or another one), e.g. after a rebuild."""
+    global _LEXICON, LEXICON_PATH
+    with _LEXICON_LOCK:
+        if path is not None:
+            LEXICON_PATH = path
+        _LEXICON = ItemLexicon.load(LEXICON_PATH, model_fingerprint())
+    return _LEXICON
+
+
+def lexicon_status() -> Dict:
+    """Path, size and, when the file was ignored, why; for the app caption and the service status."""
+    lexicon = get_lexicon()
+    return {"path": lexicon.path, "entries": len(lexicon), "invalid_reason": lexicon.invalid_reason}
+
+
+class CascadeStats:
+    """Counters per tier, shared by every caller in the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.lines = 0
+            self.lexicon_lines = 0
+            self.model_lines = 0
+            self.model_s = 0.0
+            self.receipts = 0
+            self.escalated = 0
+            self.llm_calls = 0
+
+    def add_lines(self, lexicon: int, model: int, model_s: float):
+        with self._lock:
+            self.lines += lexicon + model
+            self.lexicon_lines += lexicon
+            self.model_lines += model
+            self.model_s += model_s
+
+    def add_receipt(self, escalated: bool):
+        with self._lock:
+            self.receipts += 1
+            self.escalated += escalated
+
+    def add_llm_call(self):
+        with self._lock:
+            self.llm_calls += 1
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            lines, receipts = self.lines, self.receipts
+            return {
+                "lines": lines,
+                "receipts": receipts,
+                "lexicon_hit_rate": round(self.lexicon_lines / lines, 4) if lines else 0.0,
+                "model_rate": round(self.model_lines / lines, 4) if lines else 0.0,
+                "llm_escalation_rate": round(self.escalated / receipts, 4) if receipts else 0.0,
+                "model_ms_per_receipt": round(self.model_s * 1000 / receipts, 3) if receipts else 0.0,
+                "llm_calls": self.llm_calls,
+            }
+
+
+STATS = CascadeStats()
+
+
+def cascade_stats() -> Dict:
+    return STATS.to_dict()
+
+
+def predict_items_cascade(item_lines: List[str], threshold: float = LINE_THRESHOLD,
+                          batched: bool = False) -> List[Dict]:
+    """
+    Same output as predict_items, plus "tier" ("lexicon" or "model") per line.
+    Only the lines missing from the lexicon are tokenized and classified;
+    batched=True sends them through the micro-batching scheduler (predict_items_batched).
+    """
+    cleaned = line_filter.normalize_lines(item_lines)
+    if not cleaned:
+        return []
+
+    lexicon = get_lexicon()
+    results = [None] * len(cleaned)
+    misses = []
+    for i, name in enumerate(cleaned):
+        hit = lexicon.get(name)
+        if hit is None:
+            misses.append(i)
+            continue
+        label, conf = hit
+        results[i] = {"line": item_lines[i], "clean": name, "category": label if conf >= threshold else "other",
+                      "confidence": round(conf, 4), "tier": "lexicon"}
+
+    with tracing.span("nlp.cascade", lines=len(cleaned), lexicon_lines=len(cleaned) - len(misses)):
+        t0 = time.perf_counter()
+        if misses:
+            predict = predict_items_batched if batched else predict_items
+            preds = predict([item_lines[i] for i in misses], threshold=threshold)
+            if len(preds) != len(misses):  # model directory missing: predict_items returns one error row
+                return preds
+            for i, pred in zip(misses, preds):
+                results[i] = dict(pred, tier="model")
+        STATS.add_lines(len(cleaned) - len(misses), len(misses), time.perf_counter() - t0)
+    return results
+
+
+def receipt_confidence(predictions: List[Dict]) -> float:
+    """Mean line confidence; 0.0 when no item line was found."""
+    if not predictions:
+        return 0.0
+    return sum(p["confidence"] for p in predictions) / len(predictions)
+
+
+def needs_llm(predictions: List[Dict], threshold: float = None) -> bool:
+    threshold = LLM_ESCALATION_THRESHOLD if threshold is None else threshold
+    return receipt_confidence(predictions) < threshold
+
+
+def classify_receipt(ocr_text: str, batched: bool = False, threshold: float = None) -> Dict:
+    """Tiers 1 and 2 for one receipt, and whether tier 3 (the LLM report) should run."""
+    lines = extract_candidate_item_lines(ocr_text)
+    predictions = predict_items_cascade(lines, batched=batched) if lines else []
+    confidence = receipt_confidence(predictions)
+    escalate = needs_llm(predictions, threshold)
+    STATS.add_receipt(escalate)
+    tracing.current().set(receipt_confidence=round(confidence, 4), escalate=escalate)
+    return {
+        "predictions": predictions,
+        "confidence": round(confidence, 4),
+        "escalate": escalate,
+        "tiers": {
+            "lexicon": sum(p.get("tier") == "lexicon" for p in predictions),
+            "model": sum(p.get("tier") == "model" for p in predictions),
+        },
+    }
+
+
+def analyze_receipt(ocr_text: str, batched: bool = False, threshold: float = None,
+                    prompt_mode: Optional[str] = None) -> Dict:
+    """classify_receipt, then the DeepSeek report for escalated receipts only ("report" is None otherwise)."""
+    from src.llm_engine import get_eco_report_from_deepseek
+
+    with tracing.span("cascade.receipt"):
+        result = classify_receipt(ocr_text, batched=batched, threshold=threshold)
+        result["report"] = None
+        if result["escalate"]:
+            STATS.add_llm_call()
+            result["report"] = get_eco_report_from_deepseek(
+                ocr_text, prompt_mode=prompt_mode, predictions=result["predictions"])
+    return result
+
+
+# --- lexicon build ---
+def iter_texts(sources: Iterable[str]) -> Iterable[str]:
+    """OCR texts from image directories (through the OCR cache) or batch_pipeline JSONL files."""
+    from src.batch_pipeline import list_images
+    from src.ocr_engine import ocr_image
+
+    for src in sources:
+        if os.path.isdir(src):
+            for path in list_images(src):
+                yield ocr_image(path)[0]
+        else:
+            with open(src, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if rec.get("text"):
+                        yield rec["text"]
+
+
+def build_lexicon(texts: Iterable[str], min_count: int = 2, min_confidence: float = 0.9,
+                  max_entries: int = 5000):
+    """
+    The max_entries most frequent candidate item names (seen at least min_count times),
+    with the model's label, kept when the model is at least min_confidence sure.
+    Returns (lexicon, counts).
+    """
+    counts = Counter()
+    for text in texts:
+        counts.update(line_filter.normalize_lines(extract_candidate_item_lines(text)))
+    frequent = [name for name, n in counts.most_common(max_entries) if n >= min_count and name]
+    entries = {}
+    for pred in predict_items(frequent, threshold=0.0) if frequent else []:
+        if "clean" in pred and pred["confidence"] >= min_confidence and pred["category"] in LABELS:
+            entries[pred["clean"]] = (pred["category"], pred["confidence"])
+    return ItemLexicon(entries), counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Build the item lexicon from receipts")
+    p_build.add_argument("sources", nargs="+", help="Image directories or batch_pipeline JSONL files")
+    p_build.add_argument("--out", default=LEXICON_PATH)
+    p_build.add_argument("--min-count", type=int, default=2)
+    p_build.add_argument("--min-confidence", type=float, default=0.9)
+    p_build.add_argument("--max-entries", type=int, default=5000)
+    p_stats = sub.add_parser("stats", help="Tier hit rates over receipts (no LLM call)")
+    p_stats.add_argument("sources", nargs="+", help="Image directories or batch_pipeline JSONL files")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        lexicon, counts = build_lexicon(iter_texts(args.sources), args.min_count, args.min_confidence,
+                                        args.max_entries)
+        meta = {"built": time.strftime("%Y-%m-%dT%H:%M:%S"), "sources": args.sources,
+                "min_count": args.min_count, "min_confidence": args.min_confidence,
+                "model_fingerprint": model_fingerprint()}
+        lexicon.save(args.out, counts, meta)
+        covered = sum(counts[name] for name in lexicon.entries)
+        print(json.dumps({"entries": len(lexicon), "distinct_names": len(counts),
+                          "line_coverage": round(covered / max(sum(counts.values()), 1), 4), "out": args.out}))
+    elif args.cmd == "stats":
+        for text in iter_texts(args.sources):
+            classify_receipt(text)
+        print(json.dumps(cascade_stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Local history of analysed receipts, for spending and category reports over time.
+
+    history = get_history()
+    rid = history.record_receipt(text, predictions, total)     # after classification
+    history.attach_report(rid, report)                          # after the LLM report
+    history.spending_by_period("month")
+    history.category_totals(start="2026-01-01")
+
+One SQLite file with the raw rows (receipts, items) and small aggregate tables
+keyed by day. Every write updates the aggregates in the same transaction, so
+the dashboard queries read a few rows per day and category and never re-scan
+the item rows or re-run a model. Week/month/year views group the daily rows.
+rebuild_aggregates() recomputes them from the raw rows, e.g. after a manual edit.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+# Empty string disables the history
+HISTORY_DB = os.environ.get(
+    "SSCA_HISTORY_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "history.sqlite"),
+)
+
+# Period key of a daily aggregate row ("YYYY-MM-DD") for each report granularity
+PERIODS = {
+    "day": "day",
+    "week": "strftime('%Y-W%W', day)",
+    "month": "substr(day, 1, 7)",
+    "year": "substr(day, 1, 4)",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    total REAL,
+    n_items INTEGER NOT NULL,
+    eco_score REAL,
+    eco_category TEXT
+);
+CREATE INDEX IF NOT EXISTS receipts_day ON receipts (day);
+CREATE TABLE IF NOT EXISTS items (
+    receipt_id INTEGER NOT NULL REFERENCES receipts (id),
+    day TEXT NOT NULL,
+    line TEXT NOT NULL,
+    category TEXT NOT NULL,
+    confidence REAL
+);
+CREATE INDEX IF NOT EXISTS items_receipt ON items (receipt_id);
+CREATE INDEX IF NOT EXISTS items_category_day ON items (category, day);
+-- Aggregates, maintained on every write
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT PRIMARY KEY,
+    receipts INTEGER NOT NULL DEFAULT 0,
+    spend REAL NOT NULL DEFAULT 0,
+    scored INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_categories (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    items INTEGER NOT NULL DEFAULT 0,
+    receipts INTEGER NOT NULL DEFAULT 0,
+    confidence_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_eco_categories (
+    day TEXT NOT NULL,
+    eco_category TEXT NOT NULL,
+    receipts INTEGER NOT NULL DEFAULT 0,
+    spend REAL NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, eco_category)
+) WITHOUT ROWID;
+"""
+
+
+def receipt_key(text: str) -> str:
+    """Identity of a receipt: the same OCR text is the same receipt, whichever way it came in."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def parse_amount(value) -> Optional[float]:
+    """extract_total returns a string such as "1,234.50" (or None)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_score(report: Optional[Dict]) -> Optional[float]:
+    if not report or "error" in report:
+        return None
+    try:
+        return float(report.get("score"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+class HistoryStore:
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: the app, the batch pipeline and the service may share one file
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    # --- writes ---
+    def record_receipt(self, text: str, predictions: List[Dict], total=None, ts: Optional[float] = None,
+                       report: Optional[Dict] = None, key: Optional[str] = None) -> int:
+        """
+        Append one receipt and its classified lines (predict_items output) and update the aggregates.
+        A receipt that is already stored is not counted twice; its id is returned.
+        """
+        key = key or receipt_key(text)
+        ts = time.time() if ts is None else ts
+        day = _day(ts)
+        spend = parse_amount(total)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT id FROM receipts WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                rid = row["id"]
+            else:
+                rid = self._insert(key, ts, day, spend, predictions or [])
+        if report is not None:
+            self.attach_report(rid, report)
+        return rid
+
+    def record_many(self, receipts: List[Dict]) -> List[int]:
+        """record_receipt for many {"text", "predictions", "total", "ts"?, "report"?} dicts, one transaction."""
+        ids, reports = [], []
+        with self._lock, self._conn:
+            for rec in receipts:
+                key = rec.get("key") or receipt_key(rec["text"])
+                row = self._conn.execute("SELECT id FROM receipts WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    rid = row["id"]
+                else:
+                    ts = rec.get("ts") or time.time()
+                    rid = self._insert(key, ts, _day(ts), parse_amount(rec.get("total")),
+                                       rec.get("predictions") or [])
+                ids.append(rid)
+                if rec.get("report") is not None:
+                    reports.append((rid, rec["report"]))
+            for rid, report in reports:
+                self._set_report(rid, report)
+        return ids
+
+    def _insert(self, key: str, ts: float, day: str, spend: Optional[float], predictions: List[Dict]) -> int:
+        conn = self._conn
+        rid = conn.execute(
+            "INSERT INTO receipts (key, ts, day, total, n_items) VALUES (?, ?, ?, ?, ?)",
+            (key, ts, day, spend, len(predictions)),
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO items (receipt_id, day, line, category, confidence) VALUES (?, ?, ?, ?, ?)",
+            [(rid, day, p["line"], p["category"], p.get("confidence")) for p in predictions],
+        )
+        conn.execute(
+            "INSERT INTO daily_totals (day, receipts, spend) VALUES (?, 1, ?) "
+            "ON CONFLICT (day) DO UPDATE SET receipts = receipts + 1, spend = spend + excluded.spend",
+            (day, spend or 0.0),
+        )
+        per_category = {}
+        for p in predictions:
+            items, conf = per_category.get(p["category"], (0, 0.0))
+            per_category[p["category"]] = (items + 1, conf + (p.get("confidence") or 0.0))
+        conn.executemany(
+            "INSERT INTO daily_categories (day, category, items, receipts, confidence_sum) VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT (day, category) DO UPDATE SET items = items + excluded.items, "
+            "receipts = receipts + 1, confidence_sum = confidence_sum + excluded.confidence_sum",
+            [(day, cat, items, conf) for cat, (items, conf) in per_category.items()],
+        )
+        return rid
+
+    def attach_report(self, receipt_id: int, report: Dict):
+        """Add the LLM eco-score and consumption category of a stored receipt (replaces an earlier report)."""
+        with self._lock, self._conn:
+            self._set_report(receipt_id, report)
+
+    def _set_report(self, receipt_id: int, report: Dict):
+        score = parse_score(report)
+        if score is None:
+            return
+        category = str(report.get("consumption_category") or "Others")
+        conn = self._conn
+        row = conn.execute("SELECT day, total, eco_score, eco_category FROM receipts WHERE id = ?",
+                           (receipt_id,)).fetchone()
+        if row is None:
+            return
+        day, spend = row["day"], row["total"] or 0.0
+        if row["eco_score"] is not None:
+            # Take the previous report out of the aggregates first
+            conn.execute("UPDATE daily_totals SET scored = scored - 1, score_sum = score_sum - ? WHERE day = ?",
+                         (row["eco_score"], day))
+            conn.execute(
+                "UPDATE daily_eco_categories SET receipts = receipts - 1, spend = spend - ?, score_sum = score_sum - ? "
+                "WHERE day = ? AND eco_category = ?",
+                (spend, row["eco_score"], day, row["eco_category"]),
+            )
+        conn.execute("UPDATE receipts SET eco_score = ?, eco_category = ? WHERE id = ?",
+                     (score, category, receipt_id))
+        conn.execute("UPDATE daily_totals SET scored = scored + 1, score_sum = score_sum + ? WHERE day = ?",
+                     (score, day))
+        conn.execute(
+            "INSERT INTO daily_eco_categories (day, eco_category, receipts, spend, score_sum) VALUES (?, ?, 1, ?, ?) "
+            "ON CONFLICT (day, eco_category) DO UPDATE SET receipts = receipts + 1, "
+            "spend = spend + excluded.spend, score_sum = score_sum + excluded.score_sum",
+            (day, category, spend, score),
+        )
+
+    def rebuild_aggregates(self):
+        """Recompute every aggregate table from the receipts and items rows."""
+        with self._lock, self._conn:
+            conn = self._conn
+            conn.execute("DELETE FROM daily_totals")
+            conn.execute("DELETE FROM daily_categories")
+            conn.execute("DELETE FROM daily_eco_categories")
+            conn.execute(
+                "INSERT INTO daily_totals (day, receipts, spend, scored, score_sum) "
+                "SELECT day, COUNT(*), TOTAL(total), COUNT(eco_score), TOTAL(eco_score) FROM receipts GROUP BY day"
+            )
+            conn.execute(
+                "INSERT INTO daily_categories (day, category, items, receipts, confidence_sum) "
+                "SELECT day, category, COUNT(*), COUNT(DISTINCT receipt_id), TOTAL(confidence) "
+                "FROM items GROUP BY day, category"
+            )
+            conn.execute(
+                "INSERT INTO daily_eco_categories (day, eco_category, receipts, spend, score_sum) "
+                "SELECT day, eco_category, COUNT(*), TOTAL(total), TOTAL(eco_score) FROM receipts "
+                "WHERE eco_score IS NOT NULL GROUP BY day, eco_category"
+            )
+
+    # --- dashboard queries (aggregate tables only) ---
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    @staticmethod
+    def _range(start: Optional[str], end: Optional[str]):
+        """WHERE clause for an inclusive "YYYY-MM-DD" day range."""
+        return "day >= ? AND day <= ?", (start or "0000-00-00", end or "9999-99-99")
+
+    def spending_by_period(self, granularity: str = "month", start: Optional[str] = None,
+                           end: Optional[str] = None) -> List[Dict]:
+        """Receipts, spend and average eco-score per day/week/month/year."""
+        period = PERIODS[granularity]
+        where, params = self._range(start, end)
+        return self._query(
+            f"SELECT {period} AS period, SUM(receipts) AS receipts, ROUND(SUM(spend), 2) AS spend, "
+            f"SUM(scored) AS scored, ROUND(SUM(score_sum) / NULLIF(SUM(scored), 0), 1) AS avg_score "
+            f"FROM daily_totals WHERE {where} GROUP BY period ORDER BY period",
+            params,
+        )
+
+    def category_totals(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """Classified items per category (predict_items labels), most frequent first."""
+        where, params = self._range(start, end)
+        return self._query(
+            f"SELECT category, SUM(items) AS items, SUM(receipts) AS receipts, "
+            f"ROUND(SUM(confidence_sum) / SUM(items), 4) AS avg_confidence "
+            f"FROM daily_categories WHERE {where} GROUP BY category ORDER BY items DESC",
+            params,
+        )
+
+    def categories_by_period(self, granularity: str = "month", start: Optional[str] = None,
+                             end: Optional[str] = None) -> List[Dict]:
+        """Classified items per category and period."""
+        period = PERIODS[granularity]
+        where, params = self._range(start, end)
+        return self._query(
+            f"SELECT {period} AS period, category, SUM(items) AS items, SUM(receipts) AS receipts "
+            f"FROM daily_categories WHERE {where} GROUP BY period, category ORDER BY period, items DESC",
+            params,
+        )
+
+    def eco_spending_by_period(self, granularity: str = "month", start: Optional[str] = None,
+                               end: Optional[str] = None) -> List[Dict]:
+        """Spend and average eco-score per LLM consumption category and period (reported receipts only)."""
+        period = PERIODS[granularity]
+        where, params = self._range(start, end)
+        return self._query(
+            f"SELECT {period} AS period, eco_category, SUM(receipts) AS receipts, ROUND(SUM(spend), 2) AS spend, "
+            f"ROUND(SUM(score_sum) / NULLIF(SUM(receipts), 0), 1) AS avg_score "
+            f"FROM daily_eco_categories WHERE {where} AND receipts > 0 "
+            f"GROUP BY period, eco_category ORDER BY period, spend DESC",
+            params,
+        )
+
+    def summary(self) -> Dict:
+        row = self._query(
+            "SELECT COALESCE(SUM(receipts), 0) AS receipts, ROUND(TOTAL(spend), 2) AS spend, "
+            "COALESCE(SUM(scored), 0) AS scored, ROUND(SUM(score_sum) / NULLIF(SUM(scored), 0), 1) AS avg_score, "
+            "MIN(day) AS first_day, MAX(day) AS last_day FROM daily_totals"
+        )[0]
+        row["items"] = self._query("SELECT COALESCE(SUM(items), 0) AS n FROM daily_categories")[0]["n"]
+        return row
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_HISTORY = None
+_HISTORY_LOCK = threading.Lock()
+
+
+def get_history() -> Optional[HistoryStore]:
+    """The process-wide store at SSCA_HISTORY_DB, or None when the history is disabled."""
+    global _HISTORY
+    if _HISTORY is None and HISTORY_DB:
+        with _HISTORY_LOCK:
+            if _HISTORY is None:
+                _HISTORY = HistoryStore(HISTORY_DB)
+    return _HISTORY
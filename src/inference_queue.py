@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from src import tracing
+
+
+MAX_BATCH_SIZE = int(os.environ.get("SSCA_BATCH_MAX_SIZE", "64"))
+MAX_WAIT_MS = float(os.environ.get("SSCA_BATCH_MAX_WAIT_MS", "10"))
+
+
+class MicroBatchScheduler:
+    """
+    Collects item lines from concurrent callers and runs them through the model
+    as one padded batch.
+
+    A batch is flushed when it holds max_batch_size lines or when the oldest
+    waiting request has waited max_wait_ms, whichever comes first. Each caller
+    gets back a Future with the probability rows for its own lines, in order.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = []  # [(lines, future, enqueued_at)]
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches_run = 0
+        self.lines_run = 0
+        self._worker = threading.Thread(target=self._loop, name="item-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, lines: List[str]) -> Future:
+        fut = Future()
+        if not lines:
+            fut.set_result(np.zeros((0, 0), dtype=np.float32))
+            return fut
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatchScheduler is shut down")
+            self._pending.append((list(lines), fut, time.monotonic()))
+            self._cond.notify()
+        return fut
+
+    def run(self, lines: List[str], timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(lines).result(timeout=timeout)
+
+    def shutdown(self, wait: bool = True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if wait:
+            self._worker.join()
+
+    def _take_batch(self):
+        """Block until a batch is ready, then pop it from the queue (called with the lock held)."""
+        while not self._pending:
+            if self._closed:
+                return []
+            self._cond.wait()
+
+        deadline = self._pending[0][2] + self.max_wait
+        while True:
+            queued = sum(len(req[0]) for req in self._pending)
+            remaining = deadline - time.monotonic()
+            if queued >= self.max_batch_size or remaining <= 0 or self._closed:
+                break
+            self._cond.wait(remaining)
+
+        # Take whole requests until the size limit; a single oversized request still goes alone
+        batch, size = [], 0
+        while self._pending and (not batch or size + len(self._pending[0][0]) <= self.max_batch_size):
+            req = self._pending.pop(0)
+            batch.append(req)
+            size += len(req[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+
+            flat = [ln for lines, _, _ in batch for ln in lines]
+            try:
+                with tracing.span("nlp.microbatch", requests=len(batch), batch_lines=len(flat),
+                                  max_queue_wait_ms=round((time.monotonic() - batch[0][2]) * 1000, 2)):
+                    probs = self.batch_fn(flat)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.lines_run += len(flat)
+            offset = 0
+            for lines, fut, _ in batch:
+                fut.set_result(probs[offset:offset + len(lines)])
+                offset += len(lines)
@@ -0,0 +1,105 @@
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON object while it is still being streamed.
+
+    feed() takes the next chunk of model output and returns the (path, value)
+    pairs that became complete, e.g. ("header", "..."), ("receipt_summary.items.0", {...}),
+    ("receipt_summary.items", [...]). Values nested deeper than max_depth are only
+    reported as part of their parent. Text before the first "{" (markdown fences,
+    chatter) is ignored; `done` turns True and `result` holds the whole object once
+    the outermost brace closes.
+    """
+
+    def __init__(self, max_depth: int = 3):
+        self.max_depth = max_depth
+        self.buf = ""
+        self.pos = 0
+        self.done = False
+        self.result = None
+        self._root_start = None
+        # One frame per open container: [kind, key or index, value_start, expecting_key]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+
+    def _path(self) -> str:
+        return ".".join(str(frame[1]) for frame in self._stack)
+
+    def _finish_value(self, end: int, out: List[Tuple[str, Any]]):
+        frame = self._stack[-1]
+        if frame[2] is None:
+            return
+        if len(self._stack) <= self.max_depth:
+            try:
+                out.append((self._path(), json.loads(self.buf[frame[2]:end])))
+            except json.JSONDecodeError:
+                pass  # malformed piece; the final parse decides
+        frame[2] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        out = []
+        if self.done or not chunk:
+            return out
+        self.buf += chunk
+        buf = self.buf
+
+        for i in range(self.pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._stack[-1][1] = json.loads(buf[self._string_start:i + 1])
+                continue
+
+            if self._root_start is None:
+                if c == "{":
+                    self._root_start = i
+                    self._stack.append(["obj", None, None, True])
+                continue
+
+            top = self._stack[-1]
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = top[0] == "obj" and top[3]
+                if not self._string_is_key and top[2] is None:
+                    top[2] = i
+            elif c in "{[":
+                if top[2] is None:
+                    top[2] = i
+                self._stack.append(["obj", None, None, True] if c == "{" else ["arr", 0, None, False])
+            elif c == ":":
+                top[3] = False
+            elif c == ",":
+                self._finish_value(i, out)
+                if top[0] == "obj":
+                    top[1], top[3] = None, True
+                else:
+                    top[1] += 1
+            elif c in "}]":
+                self._finish_value(i, out)
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                    self.pos = i + 1
+                    try:
+                        self.result = json.loads(buf[self._root_start:i + 1])
+                    except json.JSONDecodeError:
+                        self.result = None
+                    return out
+            elif not c.isspace() and top[2] is None and (top[0] == "arr" or not top[3]):
+                top[2] = i  # start of a number / true / false / null
+
+        self.pos = len(buf)
+        return out
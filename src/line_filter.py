@@ -0,0 +1,117 @@
+"""
+Receipt line classification shared by the OCR and NLP engines.
+
+Every pattern is compiled once at import. Each keyword blacklist is folded,
+together with the regexes that go with it, into a single alternation, so
+deciding whether a line is an item is one regex search instead of one
+substring scan per keyword. The bulk helpers (item_line_mask, filter_item_lines,
+normalize_lines) take thousands of lines at once without a function call per line.
+
+Results are identical to the former per-engine loops in ocr_engine and nlp_engine
+(see benchmarks/bench_line_filter.py --check).
+"""
+import re
+from typing import Iterable, List
+
+
+# Lines the OCR item extraction (ocr_engine.extract_candidate_items) drops
+OCR_BLACKLIST = (
+    "total", "subtotal", "tax", "gst", "sst", "cash", "change",
+    "address", "tel", "phone", "invoice", "receipt", "date",
+    "time", "table", "cashier", "server", "pax", "sdn bhd", "jalan",
+)
+# Lines the classifier input (nlp_engine.extract_candidate_item_lines) drops
+NLP_BLACKLIST = (
+    "total", "subtotal", "tax", "gst", "sst", "vat", "cash", "change",
+    "invoice", "receipt", "thank", "date", "time", "table", "cashier",
+    "server", "rounding", "service", "summary", "amount", "balance",
+    "tel", "phone", "address",
+)
+
+# "12 jan 2020"
+DATE_PATTERN = r"\d{1,2}\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\s+\d{4}"
+# Reference numbers such as "123-abc" and long digit runs (phone, GST, card numbers)
+NOISE_PATTERN = r"(?:\d+-\w+)|(?:\d{10,})"
+
+
+def _keywords(words: Iterable[str]) -> str:
+    # Substring semantics, like `any(k in line for k in words)`
+    return "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+_OCR_REJECT = re.compile(f"{_keywords(OCR_BLACKLIST)}|{DATE_PATTERN}|{NOISE_PATTERN}")
+# A standalone "rm" (currency) also marks a non-item line
+_NLP_REJECT = re.compile(f"{_keywords(NLP_BLACKLIST)}|(?<![^ ])rm(?![^ ])")
+_TRAILING_PRICE = re.compile(r"\s+\d{1,3}(?:,\d{3})*(?:\.\d{2})\s*$")
+# Currency words, then everything that is not a letter, whitespace, "-", "&" or "/".
+# Prices and numbers fall in the second class, so one pass covers all of them.
+_NORMALIZE = re.compile(r"\b(?:rm|myr|usd)\b|[^a-z\s\-\&\/]+")
+
+
+def strip_trailing_price(line: str) -> str:
+    return _TRAILING_PRICE.sub("", line)
+
+
+def normalize_text(s: str) -> str:
+    """Lower-case a line and keep only the words the classifier was trained on."""
+    if not isinstance(s, str):
+        return ""
+    return " ".join(_NORMALIZE.sub(" ", s.lower()).split())
+
+
+def normalize_lines(lines: List[str]) -> List[str]:
+    sub = _NORMALIZE.sub
+    return [" ".join(sub(" ", s.lower()).split()) if isinstance(s, str) else "" for s in lines]
+
+
+def is_non_item(line: str) -> bool:
+    """True for header, footer and payment lines that should not reach the classifier."""
+    if not isinstance(line, str):
+        return True
+    low = line.strip().lower()
+    if len(low) < 2:
+        return True
+    if sum(c.isalpha() for c in low) <= 1:
+        return True
+    return _NLP_REJECT.search(low) is not None
+
+
+def is_candidate_item(line: str) -> bool:
+    """True when an OCR line looks like a purchased item."""
+    return (
+        len(line) > 3
+        and _OCR_REJECT.search(line.lower()) is None
+        and any(c.isalpha() for c in line)
+    )
+
+
+def item_line_mask(lines: List[str]) -> List[bool]:
+    """is_candidate_item for many lines."""
+    search = _OCR_REJECT.search
+    return [len(ln) > 3 and search(ln.lower()) is None and any(c.isalpha() for c in ln) for ln in lines]
+
+
+def filter_item_lines(lines: List[str]) -> List[str]:
+    """Item lines with their trailing price removed (ocr_engine.extract_candidate_items)."""
+    strip = _TRAILING_PRICE.sub
+    return [strip("", ln).strip() for ln, keep in zip(lines, item_line_mask(lines)) if keep]
+
+
+def candidate_item_lines(ocr_text: str, max_lines: int = 25) -> List[str]:
+    """Normalized, de-duplicated item lines of an OCR text (nlp_engine.extract_candidate_item_lines)."""
+    if not isinstance(ocr_text, str) or not ocr_text.strip():
+        return []
+
+    seen, uniq = set(), []
+    for ln in ocr_text.splitlines():
+        ln = ln.strip()
+        if not ln:
+            continue
+        ln = _TRAILING_PRICE.sub("", ln)
+        if is_non_item(ln):
+            continue
+        clean = normalize_text(ln)
+        if len(clean) >= 2 and clean not in seen:
+            seen.add(clean)
+            uniq.append(clean)
+    return uniq[:max_lines]
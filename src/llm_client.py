@@ -0,0 +1,141 @@
+"""
+asyncio client for the OpenAI-compatible chat-completions endpoint.
+
+One pooled HTTP session per client, a semaphore bounding concurrent requests,
+a timeout per request and jittered exponential backoff on 429/5xx and
+connection errors. eco_reports() produces reports for many OCR texts at once.
+
+    reports = get_eco_reports(texts)            # from sync code
+    async with AsyncLLMClient() as llm:         # from async code
+        reports = await llm.eco_reports(texts)
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import openai
+
+from src.llm_engine import (
+    LLM_BASE_URL, LLM_MODEL, LLM_PROMPT_MODE, SYSTEM_PROMPT, build_prompt, extract_report_json, get_api_key,
+    get_cached_report, record_usage, report_cache_key, sampling_params, store_report,
+)
+from src import tracing
+
+
+LLM_CONCURRENCY = int(os.environ.get("SSCA_LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.environ.get("SSCA_LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("SSCA_LLM_MAX_RETRIES", "4"))
+RETRY_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+
+def _retry_after(response) -> Optional[float]:
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class AsyncLLMClient:
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: Optional[str] = None, model: str = LLM_MODEL,
+                 concurrency: int = LLM_CONCURRENCY, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base: float = 0.5, backoff_max: float = 20.0):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self._sem = asyncio.Semaphore(concurrency)
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        # Retries are handled here, not by the SDK, so they can honour our backoff policy
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key or get_api_key(), base_url=base_url,
+            max_retries=0, timeout=timeout, http_client=self._http,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.close()
+
+    def _delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        # "Full jitter": uniform in [0, base * 2^attempt], capped
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def complete(self, messages: List[Dict], **params):
+        """One chat completion with retries; returns the SDK completion object."""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._sem:
+                    return await asyncio.wait_for(
+                        self._client.chat.completions.create(model=self.model, messages=messages, **params),
+                        timeout=self.timeout,
+                    )
+            except openai.APIStatusError as e:
+                if e.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+                retry_after = _retry_after(e.response)
+            except (openai.APIConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+            self.retries += 1
+            await asyncio.sleep(self._delay(attempt, retry_after))
+
+    async def eco_report(self, raw_ocr_text: str, max_tokens: Optional[int] = None,
+                         temperature: Optional[float] = None, use_cache: bool = True,
+                         prompt_mode: Optional[str] = None, predictions: Optional[List[Dict]] = None) -> Dict:
+        """Same result as llm_engine.get_eco_report_from_deepseek, without blocking the caller's thread."""
+        mode = prompt_mode or LLM_PROMPT_MODE
+        prompt, cache_text = build_prompt(raw_ocr_text, mode, predictions)
+        params = sampling_params(max_tokens, temperature)
+        key = report_cache_key(cache_text, self.model, params)
+        with tracing.span("llm.report", mode=mode, stream=False, client="async") as sp:
+            if use_cache:
+                cached = get_cached_report(key)
+                sp.set(cache_hit=cached is not None)
+                if cached is not None:
+                    return cached
+
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ]
+            try:
+                t0 = time.perf_counter()
+                retries_before = self.retries
+                completion = await self.complete(messages, **params)
+                sp.set(retries=self.retries - retries_before,
+                       **record_usage(mode, completion.usage, time.perf_counter() - t0))
+                report = extract_report_json(completion.choices[0].message.content)
+                if use_cache:
+                    store_report(key, report)
+                return report
+            except Exception as e:
+                sp.fail(e)
+                return {"error": f"LLM Call Failed: {str(e)}"}
+
+    async def eco_reports(self, texts: List[str], **params) -> List[Dict]:
+        """Reports for many OCR texts, at most `concurrency` requests in flight, in input order."""
+        return await asyncio.gather(*(self.eco_report(t, **params) for t in texts))
+
+
+def get_eco_reports(texts: List[str], **client_kwargs) -> List[Dict]:
+    """Blocking wrapper around AsyncLLMClient.eco_reports for scripts and Streamlit."""
+    async def run():
+        async with AsyncLLMClient(**client_kwargs) as llm:
+            return await llm.eco_reports(texts)
+    return asyncio.run(run())
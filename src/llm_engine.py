@@ -1,24 +1,75 @@
-import openai
+import hashlib
 import json
+import logging
+import os
 import re
-import streamlit as st
+import threading
+import time
+from src.cache_store import LRUCache, SQLiteStore
+from src.json_stream import IncrementalJSONParser
+from src import tracing
 
 
-HF_TOKEN = st.secrets["HF_TOKEN"]
+# OpenAI-compatible endpoint; point SSCA_LLM_BASE_URL at a local stub server for testing
+LLM_BASE_URL = os.environ.get("SSCA_LLM_BASE_URL", "https://router.huggingface.co/v1")
+LLM_MODEL = os.environ.get("SSCA_LLM_MODEL", "deepseek-ai/DeepSeek-V3")
+SYSTEM_PROMPT = "You are a professional sustainability auditor that outputs ONLY JSON."
+# Bump whenever build_eco_prompt or SYSTEM_PROMPT changes, so cached reports are not reused
+PROMPT_VERSION = "eco-v1"
+LLM_MAX_TOKENS = 1000
+# "raw": the whole OCR dump goes into the prompt; "compact": only the filtered item lines,
+# the extracted total and the local DistilBERT categories
+LLM_PROMPT_MODES = ("raw", "compact")
+LLM_PROMPT_MODE = os.environ.get("SSCA_LLM_PROMPT_MODE", "raw")
+COMPACT_MAX_ITEMS = 40
+# USD per million tokens, for the per-receipt cost in the usage log
+LLM_PRICE_IN_PER_M = float(os.environ.get("SSCA_LLM_PRICE_IN_PER_M", "0.27"))
+LLM_PRICE_OUT_PER_M = float(os.environ.get("SSCA_LLM_PRICE_OUT_PER_M", "1.10"))
+LLM_TEMPERATURE = 0.7
+# Force temperature 0 so the same receipt always yields the same (cacheable) report
+LLM_DETERMINISTIC = os.environ.get("SSCA_LLM_DETERMINISTIC", "0") == "1"
 
-# Initialize the OpenAI client to connect to models on Hugging Face
-client = openai.OpenAI(
-    api_key=HF_TOKEN, 
-    base_url="https://router.huggingface.co/v1" 
+# Report cache: memory LRU + SQLite file, both bounded by age and size. Empty DB path disables the disk tier
+LLM_CACHE_SIZE = int(os.environ.get("SSCA_LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TTL = float(os.environ.get("SSCA_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ROWS = int(os.environ.get("SSCA_LLM_CACHE_MAX_ROWS", "10000"))
+LLM_CACHE_DB = os.environ.get(
+    "SSCA_LLM_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_cache.sqlite"),
 )
 
 
+def get_api_key():
+    """HF_TOKEN from the environment, falling back to Streamlit secrets."""
+    token = os.environ.get("HF_TOKEN")
+    if token:
+        return token
+    import streamlit as st
 
-def get_eco_report_from_deepseek(raw_ocr_text):
+    return st.secrets["HF_TOKEN"]
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
     """
-    Calling DeepSeek on Hugging Face via OpenAI SDK
+    OpenAI client for the models on Hugging Face, created on first use so that importing
+    this module needs neither the openai package loaded nor an API key.
     """
-    prompt = f"""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                import openai
+
+                _CLIENT = openai.OpenAI(api_key=get_api_key(), base_url=LLM_BASE_URL)
+    return _CLIENT
+
+
+def build_eco_prompt(raw_ocr_text):
+    return f"""
     ### ROLE ###
     You are a Senior Sustainability Audit Expert. Your goal is to analyze the provided OCR text from a shopping receipt and generate a human-centric, professional sustainability report.
 
@@ -59,47 +110,298 @@ def get_eco_report_from_deepseek(raw_ocr_text):
     {raw_ocr_text}
     """
 
-    try:
-        completion = client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-V3", 
-            messages=[
-                {"role": "system", "content": "You are a professional sustainability auditor that outputs ONLY JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            # Limit the number of tokens output to save overhead.
-            max_tokens=1000,
-            temperature=0.7
-        )
-
-        result_text = completion.choices[0].message.content
-        
-        # JSON extraction logic
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        
-        return {"error": "Invalid JSON format in model response."}
-
-    except Exception as e:
-        return {"error": f"LLM Call Failed: {str(e)}"}
+
+def build_compact_prompt(payload):
+    return f"""### ROLE ###
+Senior Sustainability Audit Expert. Write a human-centric sustainability report for this shopping receipt.
+
+### TASKS ###
+1. Clean the item names (fix OCR artifacts) and keep their prices.
+2. Categorize the transaction: [Dining & Eating Out / Grocery & Fresh Food / Household & Living / Others].
+3. Audit: Dining -> nutrition balance; Grocery -> veg-to-meat ratio, local/low-carbon items; Household -> packaging and eco-friendly materials. The local category hints come from a small classifier and may be wrong.
+4. Link the purchase to one UN SDG.
+
+### OUTPUT (STRICT JSON ONLY) ###
+{{"header": "catchy title", "receipt_summary": {{"items": [{{"name": "", "price": ""}}], "total_amount": ""}}, "consumption_category": "", "audit_details": {{"positives": [""], "concerns": [""], "suggestion": "friendly tip"}}, "sdg_impact": {{"target": "SDG n: name", "explanation": ""}}, "score": 0-100, "soul_quote": ""}}
+
+### RECEIPT ###
+{payload}"""
+
+
+def compact_receipt_payload(raw_ocr_text, predictions=None):
+    """
+    Item lines that survive the OCR filters (with their prices), the extracted total
+    and the local category of each line.
+    :param predictions: predict_items output for these lines or for their normalized
+        form (extract_candidate_item_lines), if the caller already has it
+    """
+    from src.line_filter import item_line_mask, normalize_text, strip_trailing_price
+    from src.ocr_engine import extract_total
+
+    lines = [ln.strip() for ln in (raw_ocr_text or "").splitlines() if ln.strip()]
+    # Keep the whole line (price included) for every line the item filter accepts
+    item_lines = [ln for ln, keep in zip(lines, item_line_mask(lines)) if keep][:COMPACT_MAX_ITEMS]
+    if predictions is None and item_lines:
+        from src.nlp_engine import predict_items
+        try:
+            predictions = predict_items(item_lines)
+        except Exception as e:
+            # The categories are only hints, the report can be written without them
+            print(f"Compact prompt classification Error: {e}")
+            predictions = []
+    # Predictions may be for the raw lines or for their normalized form (the service and
+    # the cascade classify extract_candidate_item_lines output), so both are looked up
+    key = lambda ln: normalize_text(strip_trailing_price(ln))
+    categories = {}
+    for p in predictions or []:
+        line = p.get("line") or ""
+        categories[line] = p.get("category")
+        categories.setdefault(key(line), p.get("category"))
+
+    rows = [f"- {ln} | {categories.get(ln) or categories.get(key(ln)) or 'other'}" for ln in item_lines]
+    return "Total: {}\nItems (OCR line | local category):\n{}".format(
+        extract_total(lines), "\n".join(rows) or "- none found"
+    )
+
+
+def build_prompt(raw_ocr_text, prompt_mode=None, predictions=None):
+    """Returns (prompt, cache_text) for the selected prompt mode."""
+    mode = prompt_mode or LLM_PROMPT_MODE
+    if mode == "compact":
+        payload = compact_receipt_payload(raw_ocr_text, predictions)
+        return build_compact_prompt(payload), "compact\n" + payload
+    if mode != "raw":
+        raise ValueError(f"Unknown prompt mode '{mode}', expected one of {LLM_PROMPT_MODES}")
+    return build_eco_prompt(raw_ocr_text), raw_ocr_text
+
+
+logger = logging.getLogger(__name__)
+TOKEN_STATS = {}
+
+
+def record_usage(mode, usage, latency_s):
+    """Log token counts and cost of one call and add them to TOKEN_STATS[mode]."""
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    cost = (prompt_tokens * LLM_PRICE_IN_PER_M + completion_tokens * LLM_PRICE_OUT_PER_M) / 1e6
+    stats = TOKEN_STATS.setdefault(
+        mode, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "latency_s": 0.0}
+    )
+    stats["calls"] += 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    stats["cost_usd"] += cost
+    stats["latency_s"] += latency_s
+    logger.info(
+        "llm call mode=%s prompt_tokens=%d completion_tokens=%d cost_usd=%.6f latency_s=%.2f%s",
+        mode, prompt_tokens, completion_tokens, cost, latency_s, "" if usage else " (no usage reported)",
+    )
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "cost_usd": round(cost, 6), "latency_s": round(latency_s, 3)}
+
+
+def extract_report_json(result_text):
+    """Pull the JSON object out of the model response."""
+    json_match = re.search(r'\{.*\}', result_text or "", re.DOTALL)
+    if json_match:
+        return json.loads(json_match.group())
+    return {"error": "Invalid JSON format in model response."}
+
+
+def sampling_params(max_tokens=None, temperature=None):
+    params = {
+        "max_tokens": max_tokens if max_tokens is not None else LLM_MAX_TOKENS,
+        "temperature": temperature if temperature is not None else LLM_TEMPERATURE,
+    }
+    if LLM_DETERMINISTIC:
+        params["temperature"] = 0
+    return params
+
+
+def normalize_ocr_text(raw_ocr_text):
+    """Collapse whitespace and blank lines so OCR reruns of the same receipt share a key."""
+    lines = (re.sub(r"\s+", " ", ln).strip() for ln in (raw_ocr_text or "").splitlines())
+    return "\n".join(ln for ln in lines if ln)
+
+
+def report_cache_key(raw_ocr_text, model, params):
+    payload = json.dumps(
+        {"text": normalize_ocr_text(raw_ocr_text), "model": model, "prompt": PROMPT_VERSION, **params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+_REPORT_MEMORY = LRUCache(LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+_REPORT_DISK = None
+REPORT_CACHE_STATS = {"hits": 0, "misses": 0, "stored": 0}
+
+
+def _report_disk():
+    global _REPORT_DISK
+    if _REPORT_DISK is None and LLM_CACHE_DB:
+        _REPORT_DISK = SQLiteStore(LLM_CACHE_DB, table="eco_reports")
+        _REPORT_DISK.delete_older_than(LLM_CACHE_TTL)
+    return _REPORT_DISK
+
+
+def get_cached_report(key):
+    report = _REPORT_MEMORY.get(key)
+    if report is None and _report_disk() is not None:
+        report = _report_disk().get(PROMPT_VERSION, key, max_age=LLM_CACHE_TTL)
+        if report is not None:
+            _REPORT_MEMORY.put(key, report)
+    REPORT_CACHE_STATS["hits" if report is not None else "misses"] += 1
+    return report
+
+
+def store_report(key, report):
+    """Only well-formed reports are cached; error dicts are always retried."""
+    if not isinstance(report, dict) or "error" in report:
+        return
+    _REPORT_MEMORY.put(key, report)
+    disk = _report_disk()
+    if disk is not None:
+        disk.put(PROMPT_VERSION, key, report)
+        if REPORT_CACHE_STATS["stored"] % 100 == 0:
+            disk.trim(LLM_CACHE_MAX_ROWS)
+    REPORT_CACHE_STATS["stored"] += 1
+
+
+def get_eco_report_from_deepseek(raw_ocr_text, use_cache=True, prompt_mode=None, predictions=None):
+    """
+    Calling DeepSeek on Hugging Face via OpenAI SDK
+    """
+    mode = prompt_mode or LLM_PROMPT_MODE
+    prompt, cache_text = build_prompt(raw_ocr_text, mode, predictions)
+    # Limit the number of tokens output to save overhead.
+    params = sampling_params()
+    key = report_cache_key(cache_text, LLM_MODEL, params)
+    with tracing.span("llm.report", mode=mode, stream=False) as sp:
+        if use_cache:
+            cached = get_cached_report(key)
+            sp.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+        try:
+            t0 = time.perf_counter()
+            completion = get_client().chat.completions.create(
+                model=LLM_MODEL, 
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                **params
+            )
+            sp.set(**record_usage(mode, completion.usage, time.perf_counter() - t0))
+
+            result_text = completion.choices[0].message.content
+            
+            # JSON extraction logic
+            report = extract_report_json(result_text)
+            if use_cache:
+                store_report(key, report)
+            return report
+
+        except Exception as e:
+            sp.fail(e)
+            return {"error": f"LLM Call Failed: {str(e)}"}
     
+def stream_eco_report(raw_ocr_text, use_cache=True, prompt_mode=None, predictions=None):
+    """
+    Streamed variant of get_eco_report_from_deepseek.
+    Yields (path, value) as soon as each field of the report is complete, e.g.
+    ("header", ...), ("score", 85), ("receipt_summary.items", [...]); the last
+    event is ("", report) with the full parsed report (or an error dict).
+    """
+    mode = prompt_mode or LLM_PROMPT_MODE
+    prompt, cache_text = build_prompt(raw_ocr_text, mode, predictions)
+    params = sampling_params()
+    key = report_cache_key(cache_text, LLM_MODEL, params)
+    # Not a `with` block: between yields this code runs in the consumer's context
+    sp = tracing.start_span("llm.report", mode=mode, stream=True)
+    try:
+        if use_cache:
+            cached = get_cached_report(key)
+            sp.set(cache_hit=cached is not None)
+            if cached is not None:
+                for field, value in cached.items():
+                    yield field, value
+                yield "", cached
+                return
+
+        parser = IncrementalJSONParser()
+        chunks = []
+        usage = None
+        try:
+            t0 = time.perf_counter()
+            stream = get_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True,
+                # The last chunk then carries the token usage of the whole completion
+                stream_options={"include_usage": True},
+                **params
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                if sp and not chunks:
+                    sp.set(first_token_ms=round((time.perf_counter() - t0) * 1000, 1))
+                chunks.append(delta)
+                for event in parser.feed(delta):
+                    yield event
+        except Exception as e:
+            sp.fail(e)
+            yield "", {"error": f"LLM Call Failed: {str(e)}"}
+            return
+        sp.set(**record_usage(mode, usage, time.perf_counter() - t0))
+
+        report = parser.result if parser.result is not None else parse_llm_json("".join(chunks))
+        if use_cache:
+            store_report(key, report)
+        yield "", report
+    finally:
+        sp.end()
+
+
 def parse_llm_json(raw_response):
     """
-    Clean the text returned by the LLM and parse it into a Python dictionary
+    智能解析函数：
+    1. 如果输入已经是字典，直接返回。
+    2. 如果是字符串，则尝试清洗并解析。
+    INTELIGENT PARSING FUNCTION
+    1. If input is already a dict, return as is.
+    2. If it's a string, attempt to clean and parse it.
     """
+    # --- 类型保护 ---
+    # 1. Type Guarding ---
+    if isinstance(raw_response, dict):
+        return raw_response
+    
+    if not raw_response or not isinstance(raw_response, str):
+        return {"error": "Invalid input type: expected string or dict"}
+    
     try:
-        # 1. 使用正则提取 JSON 块（防止模型返回多余的 Markdown 标记或解释词）
-        # 1. Use regex to extract the JSON block (to avoid extra markdown or explanatory words from the model)
-        json_pattern = r'\{.*\}'
-        match = re.search(json_pattern, raw_response, re.DOTALL)
-        
-        if match:
-            json_str = match.group()
-            return json.loads(json_str)
-        else:
-            # 如果没找到 JSON 括号，尝试直接解析整个字符串
-            # If no JSON braces found, try parsing the whole string directly
-            return json.loads(raw_response)
-    except Exception as e:
-        print(f"JSON Parsing Error: {e}")
-        return None 
\ No newline at end of file
+        # 尝试直接解析
+        # Try direct parsing
+        return json.loads(raw_response)
+    except json.JSONDecodeError:
+        try:
+            # 1. 使用正则提取 JSON 块（防止模型返回多余的 Markdown 标记或解释词）
+            # 1. Use regex to extract the JSON block (to avoid extra markdown or explanatory words from the model)
+            json_pattern = r'(\{.*\})'
+            match = re.search(json_pattern, raw_response, re.DOTALL)
+            if match:
+                return json.loads(match.group(1))
+            else:
+                return {"error": "No valid JSON structure found"}
+        except Exception as e:
+            return {"error": f"Parsing failed: {str(e)}"}
@@ -0,0 +1,156 @@
+"""
+Local stand-in for the OpenAI-compatible chat-completions endpoint.
+
+Returns a fixed, valid eco-report so the LLM code paths can be exercised and
+benchmarked without network access or an API key.
+
+    python -m src.llm_stub_server --port 8089 --latency 0.2 --fail-rate 0.1
+    SSCA_LLM_BASE_URL=http://127.0.0.1:8089/v1 HF_TOKEN=stub streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+STUB_REPORT = {
+    "header": "The Everyday Basket",
+    "receipt_summary": {
+        "items": [
+            {"name": "Fresh Milk 1L", "price": "RM 6.90"},
+            {"name": "Plastic Bag", "price": "RM 0.20"},
+        ],
+        "total_amount": "RM 7.10",
+    },
+    "consumption_category": "Grocery & Fresh Food",
+    "audit_details": {
+        "positives": ["Fresh dairy is a good source of protein."],
+        "concerns": ["A single-use plastic bag was purchased."],
+        "suggestion": "Bring a reusable tote next time and skip the bag fee.",
+    },
+    "sdg_impact": {
+        "target": "SDG 12: Responsible Consumption and Production",
+        "explanation": "Cutting single-use plastics reduces waste from everyday shopping.",
+    },
+    "score": 72,
+    "soul_quote": "Small choices, repeated daily, shape the world.",
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    fail_rate = 0.0
+    report = STUB_REPORT
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self._send_json(400, {"error": {"message": "invalid JSON body"}})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "not found"}})
+
+        if self.fail_rate and random.random() < self.fail_rate:
+            status = random.choice([429, 503])
+            return self._send_json(status, {"error": {"message": "stub overload"}}, {"Retry-After": "0"})
+
+        content = json.dumps(self.report, indent=2)
+        prompt_chars = sum(len(m.get("content") or "") for m in req.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_chars // 4 + len(content) // 4,
+        }
+        if req.get("stream"):
+            return self._stream(req, content, usage)
+
+        if self.latency:
+            time.sleep(self.latency)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    def _stream(self, req, content, usage):
+        """Server-sent events, spreading `latency` over the chunks like a real generation."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        delay = self.latency / (len(pieces) + 1)
+
+        def send(choices, **extra):
+            payload = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": req.get("model", "stub"), "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+        for n, piece in enumerate(pieces):
+            time.sleep(delay)
+            delta = {"content": piece} if n else {"role": "assistant", "content": piece}
+            send([{"index": 0, "delta": delta, "finish_reason": None}])
+        send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (req.get("stream_options") or {}).get("include_usage"):
+            send([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_rate: float = 0.0):
+    """Start the stub in a background thread; returns (server, base_url)."""
+    handler = type("Handler", (StubHandler,), {"latency": latency, "fail_rate": fail_rate})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 429/503")
+    args = parser.parse_args()
+
+    handler = type("Handler", (StubHandler,), {"latency": args.latency, "fail_rate": args.fail_rate})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Stub chat-completions server on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# torch and transformers are imported by the backends that need them, on first load:
+# importing them takes seconds and the onnx backend does not use them at all
+
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+NLP_BACKEND = os.environ.get("SSCA_NLP_BACKEND", "torch")
+ONNX_THREADS = int(os.environ.get("SSCA_ONNX_THREADS", "0"))  # 0 = let ONNX Runtime decide
+
+
+def default_onnx_path(model_dir: str) -> str:
+    return os.environ.get("SSCA_ONNX_PATH", os.path.join(model_dir, "onnx", "model.onnx"))
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    z = logits - logits.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class TorchBackend:
+    """The original fp32 PyTorch model."""
+
+    name = "torch"
+
+    def __init__(self, model_dir: str):
+        from transformers import AutoModelForSequenceClassification
+
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        self.model.eval()
+
+    def __call__(self, enc: Dict[str, np.ndarray]) -> np.ndarray:
+        import torch
+
+        with torch.inference_mode():
+            inputs = {k: torch.from_numpy(v) for k, v in enc.items()}
+            logits = self.model(**inputs).logits
+            return torch.softmax(logits, dim=-1).cpu().numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch dynamic INT8 quantization of the Linear layers (weights int8, activations quantized on the fly)."""
+
+    name = "torch-int8"
+
+    def __init__(self, model_dir: str):
+        import torch
+
+        super().__init__(model_dir)
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend:
+    """Exported ONNX graph run through ONNX Runtime on CPU."""
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str, onnx_path: str = None):
+        import onnxruntime as ort
+
+        onnx_path = onnx_path or default_onnx_path(model_dir)
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {onnx_path}. Run: python -m src.nlp_backends export"
+            )
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            opts.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(onnx_path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, enc: Dict[str, np.ndarray]) -> np.ndarray:
+        feeds = {k: enc[k].astype(np.int64) for k in self.input_names}
+        logits = self.session.run(None, feeds)[0]
+        return _softmax(logits)
+
+
+def load_backend(name: str, model_dir: str):
+    if name == "torch":
+        return TorchBackend(model_dir)
+    if name == "torch-int8":
+        return QuantizedTorchBackend(model_dir)
+    if name == "onnx":
+        return OnnxBackend(model_dir)
+    raise ValueError(f"Unknown NLP backend '{name}', expected one of {BACKENDS}")
+
+
+def export_onnx(model_dir: str, out_path: str = None, opset: int = 17) -> str:
+    """Export the fp32 classifier to ONNX with dynamic batch and sequence axes."""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    out_path = out_path or default_onnx_path(model_dir)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    model.config.return_dict = False
+    dummy = (torch.ones(2, 8, dtype=torch.long), torch.ones(2, 8, dtype=torch.long))
+    kwargs = dict(
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=opset,
+    )
+    try:
+        torch.onnx.export(model, dummy, out_path, dynamo=False, **kwargs)
+    except TypeError:
+        # Older torch releases have no dynamo switch
+        torch.onnx.export(model, dummy, out_path, **kwargs)
+    return out_path
+
+
+def parity_report(lines: List[str], model_dir: str, backends=("torch-int8", "onnx")) -> Dict:
+    """
+    Compare each backend with the fp32 reference on the same lines:
+    label agreement, confidence drift and per-batch latency.
+    """
+    from src.nlp_engine import normalize_text
+    from transformers import AutoTokenizer
+
+    tok = AutoTokenizer.from_pretrained(model_dir)
+    cleaned = [normalize_text(x) for x in lines]
+    cleaned = [c for c in cleaned if c]
+    if not cleaned:
+        raise ValueError("No usable lines for the parity check")
+    enc = dict(tok(cleaned, padding=True, truncation=True, return_tensors="np"))
+
+    def timed(backend):
+        backend(enc)  # warm-up run
+        t0 = time.perf_counter()
+        probs = backend(enc)
+        return probs, (time.perf_counter() - t0) * 1000
+
+    ref_probs, ref_ms = timed(TorchBackend(model_dir))
+    ref_labels = ref_probs.argmax(axis=-1)
+    ref_conf = ref_probs.max(axis=-1)
+
+    report = {"lines": len(cleaned), "torch": {"latency_ms": round(ref_ms, 2)}}
+    for name in backends:
+        try:
+            probs, ms = timed(load_backend(name, model_dir))
+        except Exception as e:
+            report[name] = {"error": str(e)}
+            continue
+        drift = np.abs(probs.max(axis=-1) - ref_conf)
+        report[name] = {
+            "latency_ms": round(ms, 2),
+            "speedup": round(ref_ms / ms, 2) if ms else None,
+            "label_agreement": round(float((probs.argmax(axis=-1) == ref_labels).mean()), 4),
+            "mean_conf_drift": round(float(drift.mean()), 5),
+            "max_conf_drift": round(float(drift.max()), 5),
+        }
+    return report
+
+
+def main():
+    from src.nlp_engine import MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Item classifier backends: ONNX export and parity check")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_exp = sub.add_parser("export", help="Export the fp32 model to ONNX")
+    p_exp.add_argument("--out", default=None)
+    p_exp.add_argument("--opset", type=int, default=17)
+
+    p_par = sub.add_parser("parity", help="Compare backends against fp32 on held-out receipt lines")
+    p_par.add_argument("lines_file", help="Text file with one receipt line per line")
+    p_par.add_argument("--backends", nargs="+", default=["torch-int8", "onnx"])
+
+    args = parser.parse_args()
+    if args.cmd == "export":
+        print(export_onnx(args.model_dir, args.out, args.opset))
+    else:
+        with open(args.lines_file, encoding="utf-8") as f:
+            lines = [ln.strip() for ln in f if ln.strip()]
+        print(json.dumps(parity_report(lines, args.model_dir, args.backends), indent=2))
+
+
+if __name__ == "__main__":
+    main()
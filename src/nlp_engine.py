@@ -1,11 +1,37 @@
 import os
-import re
-import torch
+import hashlib
+import threading
 import numpy as np
-from typing import List, Dict
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from typing import List, Dict, Optional, Tuple
+from src.nlp_backends import NLP_BACKEND, default_onnx_path, load_backend
+from src.cache_store import LRUCache, SQLiteStore
+from src import line_filter, tracing
 
 
+MODEL_DIR = os.environ.get(
+    "SSCA_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "item_classifier_model"),
+)
+
+# Receipt item names are a handful of word pieces; long OCR garbage lines are cut here
+MAX_LENGTH = int(os.environ.get("SSCA_MAX_LENGTH", "32"))
+# Lines per forward pass, bounds activation memory for large line lists
+INFER_BATCH_SIZE = int(os.environ.get("SSCA_INFER_BATCH_SIZE", "32"))
+# Classification cache: in-memory LRU entries, and an optional SQLite file for the on-disk tier
+NLP_CACHE_SIZE = int(os.environ.get("SSCA_NLP_CACHE_SIZE", "4096"))
+NLP_CACHE_DB = os.environ.get("SSCA_NLP_CACHE_DB", "")
+
+# What the classifier is loaded from; other files in the model directory (training_args.bin,
+# the onnx/ export directory, ...) do not change the predictions of the active backend
+MODEL_FILES = (
+    "config.json", "model.safetensors", "pytorch_model.bin",
+    "tokenizer.json", "tokenizer_config.json", "special_tokens_map.json", "vocab.txt",
+)
+# Weight files are fingerprinted from their size and this many evenly spaced blocks, not read whole
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+
 LABELS = [
     "fresh_food", "processed_food", "sugary_drink", "single_use_plastic",
     "household_chemical", "eco_friendly", "non_essential", "other"
@@ -14,81 +40,312 @@ id2label = {i: l for i, l in enumerate(LABELS)}
 
 
 def normalize_text(s: str) -> str:
-    if not isinstance(s, str): return ""
-    s = s.lower()
-    s = re.sub(r"\b(rm|myr|usd)\b", " ", s)
-    s = re.sub(r"\b\d{1,3}(?:,\d{3})*(?:\.\d{2})\b", " ", s)  # prices
-    s = re.sub(r"\b\d+\b", " ", s)  # numbers
-    s = re.sub(r"[^a-z\s\-\&\/]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    return line_filter.normalize_text(s)
 
 
 def looks_like_non_item(line: str) -> bool:
-    if not isinstance(line, str): return True
-    low = line.strip().lower()
-    if len(low) < 2: return True
-    if sum(c.isalpha() for c in low) <= 1: return True
-
-    blacklist = [
-        "total", "subtotal", "tax", "gst", "sst", "vat", "cash", "change", 
-        "invoice", "receipt", "thank", "date", "time", "table", "cashier", 
-        "server", "rounding", "service", "summary", "amount", "balance",
-        "tel", "phone", "address",
-    ]
-    if any(k in low for k in blacklist): return True
-    if " rm " in f" {low} ": return True
-    return False
+    return line_filter.is_non_item(line)
 
 
 def extract_candidate_item_lines(ocr_text: str, max_lines: int = 25) -> List[str]:
-    if not isinstance(ocr_text, str) or not ocr_text.strip():
-        return []
+    return line_filter.candidate_item_lines(ocr_text, max_lines)
 
-    lines = [ln.strip() for ln in ocr_text.splitlines() if ln.strip()]
-    items = []
 
-    for ln in lines:
+class ClassifierRegistry:
+    """
+    Process-wide holder for the DistilBERT tokenizer and inference backend.
+    The weights are read from disk once and shared by every Streamlit session.
+    """
 
-        ln2 = re.sub(r"\s+\d{1,3}(?:,\d{3})*(?:\.\d{2})\s*$", "", ln.strip())
-        if looks_like_non_item(ln2):
-            continue
-        clean = normalize_text(ln2)
-        if clean and len(clean) >= 2:
-            items.append(clean)
+    def __init__(self, model_dir: str = MODEL_DIR, backend: str = NLP_BACKEND):
+        self.model_dir = model_dir
+        self.backend_name = backend
+        self._lock = threading.Lock()
+        # Fast tokenizers are not safe to call from several threads at once
+        self.tokenizer_lock = threading.Lock()
+        self._tokenizer = None
+        self._model = None
+        self._signature = None
+        self.checksum = None
+        self._fingerprint = (None, None)  # (signature it was computed for, digest)
 
-    seen, uniq = set(), []
-    for it in items:
-        if it not in seen:
-            uniq.append(it)
-            seen.add(it)
-    return uniq[:max_lines]
+    def _model_files(self) -> List[str]:
+        """MODEL_FILES present in the model directory, plus the ONNX graph when the onnx backend is active."""
+        paths = [os.path.join(self.model_dir, name) for name in MODEL_FILES]
+        if self.backend_name == "onnx":
+            onnx_path = default_onnx_path(self.model_dir)
+            paths += [onnx_path, onnx_path + ".data"]  # .data: external weights of large exports
+        return [p for p in paths if os.path.isfile(p)]
 
+    def _dir_signature(self) -> Tuple:
+        entries = []
+        for path in self._model_files():
+            info = os.stat(path)
+            entries.append((os.path.relpath(path, self.model_dir), info.st_size, info.st_mtime_ns))
+        return tuple(entries)
 
-@torch.inference_mode()
-def predict_items(item_lines: List[str], threshold: float = 0.45) -> List[Dict]:
+    def _dir_checksum(self, signature: Optional[Tuple] = None) -> str:
+        """
+        Digest of the names, sizes and mtimes of the model files, used to invalidate
+        cached predictions. Only stat() calls: the weights are not read a second time.
+        """
+        return hashlib.sha256(repr(signature or self._dir_signature()).encode()).hexdigest()
 
-    MODEL_DIR = "models/item_classifier_model"
-    
-    if not os.path.exists(MODEL_DIR):
-        return [{"line": "Error", "category": "Model path not found", "confidence": 0}]
+    def fingerprint(self) -> str:
+        """
+        Digest of the contents of MODEL_FILES: config and tokenizer files whole, weight files by
+        size and sampled blocks. Unlike the checksum it does not depend on mtimes or on the ONNX
+        export, so it survives a clone, checkout or redeploy of the same model. Recomputed only
+        when the file signature changes.
+        """
+        signature = tuple(entry for entry in self._dir_signature() if entry[0] in MODEL_FILES)
+        if self._fingerprint[0] == signature:
+            return self._fingerprint[1]
+        digest = hashlib.sha256()
+        for name, size, _ in signature:
+            digest.update(f"{name}:{size}\n".encode())
+            with open(os.path.join(self.model_dir, name), "rb") as f:
+                if name not in WEIGHT_FILES:
+                    digest.update(f.read())
+                    continue
+                step = max(size // FINGERPRINT_BLOCKS, 1)
+                for offset in range(0, size, step):
+                    f.seek(offset)
+                    digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+        self._fingerprint = (signature, digest.hexdigest())
+        return self._fingerprint[1]
 
-    tok = AutoTokenizer.from_pretrained(MODEL_DIR)
-    mdl = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR)
-    mdl.eval()
+    def _load(self):
+        from transformers import AutoTokenizer
 
-    cleaned = [normalize_text(x) for x in item_lines]
-    if not cleaned: return []
-    
-    enc = tok(cleaned, padding=True, truncation=True, return_tensors="pt")
-    outputs = mdl(**enc)
-    probs = torch.softmax(outputs.logits, dim=-1).cpu().numpy()
+        with tracing.span("nlp.load_model", backend=self.backend_name):
+            tok = AutoTokenizer.from_pretrained(self.model_dir)
+            mdl = load_backend(self.backend_name, self.model_dir)
+        self._tokenizer, self._model = tok, mdl
+        self._signature = self._dir_signature()
+        self.checksum = self._dir_checksum(self._signature)
+
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self):
+        """Return (tokenizer, backend), loading them on first use."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._load()
+        return self._tokenizer, self._model
+
+    def is_stale(self) -> bool:
+        """True when the model files (MODEL_FILES, the ONNX graph for onnx) changed since the last load."""
+        if self._signature is None or not os.path.isdir(self.model_dir):
+            return False
+        return self._dir_signature() != self._signature
+
+    def reload(self, model_dir: Optional[str] = None, backend: Optional[str] = None):
+        """Drop the current weights and load them again (optionally from a new directory or backend)."""
+        with self._lock:
+            if model_dir is not None:
+                self.model_dir = model_dir
+            if backend is not None:
+                self.backend_name = backend
+            self._load()
+        return self._tokenizer, self._model
+
+
+_REGISTRY = ClassifierRegistry()
+
+
+def get_classifier():
+    return _REGISTRY.get()
+
+
+def warm_up_classifier() -> bool:
+    """
+    Load the classifier ahead of the first request.
+    Returns False when the model directory is missing or cannot be loaded.
+    """
+    if not os.path.exists(_REGISTRY.model_dir):
+        return False
+    try:
+        _REGISTRY.get()
+    except Exception as e:
+        print(f"Model warm-up Error: {e}")
+        return False
+    return True
+
+
+def model_checksum() -> Optional[str]:
+    """Checksum of the loaded weights, or of the model directory on disk if nothing is loaded yet."""
+    if _REGISTRY.checksum is not None:
+        return _REGISTRY.checksum
+    if not os.path.isdir(_REGISTRY.model_dir):
+        return None
+    return _REGISTRY._dir_checksum()
+
+
+def model_fingerprint() -> Optional[str]:
+    """Content digest of the model files (ClassifierRegistry.fingerprint), for artifacts derived from the model."""
+    if not os.path.isdir(_REGISTRY.model_dir):
+        return None
+    return _REGISTRY.fingerprint()
+
+
+def classifier_status() -> Dict:
+    """Load state of the shared classifier, for health checks."""
+    return {
+        "loaded": _REGISTRY.is_loaded(),
+        "backend": _REGISTRY.backend_name,
+        "model_dir": _REGISTRY.model_dir,
+        "checksum": _REGISTRY.checksum,
+    }
+
+
+def reload_classifier(model_dir: Optional[str] = None, only_if_changed: bool = False,
+                      backend: Optional[str] = None) -> bool:
+    """
+    Reload hook for when the model directory is replaced or the backend is switched
+    ("torch", "torch-int8" or "onnx", see src/nlp_backends.py).
+    With only_if_changed=True the weights are reloaded only if the files changed on disk.
+    """
+    if only_if_changed and not (model_dir or backend or _REGISTRY.is_stale()):
+        return False
+    _REGISTRY.reload(model_dir, backend)
+    return True
+
+
+def classify_probs(cleaned: List[str], max_length: int = MAX_LENGTH,
+                   batch_size: int = INFER_BATCH_SIZE) -> np.ndarray:
+    """
+    Classify already-normalized lines and return softmax probabilities in input order.
+    Lines are sorted by token length and run in chunks of batch_size, so each chunk
+    is only padded to its own longest line.
+    """
+    tok, backend = get_classifier()
+    with tracing.span("nlp.classify", lines=len(cleaned), batch_size=batch_size, max_length=max_length):
+        with _REGISTRY.tokenizer_lock:
+            ids = tok(cleaned, truncation=True, max_length=max_length)["input_ids"]
+
+        pad_id = tok.pad_token_id or 0
+        order = sorted(range(len(ids)), key=lambda i: len(ids[i]))
+        probs = np.zeros((len(ids), len(LABELS)), dtype=np.float32)
+
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            width = len(ids[chunk[-1]])
+            input_ids = np.full((len(chunk), width), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(chunk), width), dtype=np.int64)
+            for row, i in enumerate(chunk):
+                input_ids[row, :len(ids[i])] = ids[i]
+                attention_mask[row, :len(ids[i])] = 1
+            probs[chunk] = backend({"input_ids": input_ids, "attention_mask": attention_mask})
+        return probs
+
+
+def top_labels(probs: np.ndarray) -> List[Tuple[str, float]]:
+    """Best (label, confidence) per row, before the 'other' threshold is applied."""
+    return [(id2label[int(np.argmax(p))], float(np.max(p))) for p in probs]
+
+
+class ClassificationCache:
+    """
+    Normalized item text -> (label, confidence).
+    Memory LRU in front of an optional SQLite tier; entries are keyed by a namespace made of
+    the model checksum, backend and max_length, and older namespaces are dropped when it changes.
+    """
+
+    def __init__(self, maxsize: int = NLP_CACHE_SIZE, db_path: str = NLP_CACHE_DB):
+        self.memory = LRUCache(maxsize)
+        self.disk = SQLiteStore(db_path, table="item_predictions") if db_path else None
+        self.namespace = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
 
+    def _use_namespace(self, ns: str):
+        with self._lock:
+            if ns == self.namespace:
+                return
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.delete_other_namespaces(ns)
+            self.namespace = ns
+
+    def lookup(self, ns: str, texts: List[str]) -> Dict[str, Tuple[str, float]]:
+        self._use_namespace(ns)
+        found = {}
+        for t in texts:
+            hit = self.memory.get((ns, t))
+            if hit is not None:
+                found[t] = hit
+        n_mem = len(found)
+        rest = [t for t in texts if t not in found]
+        if rest and self.disk is not None:
+            for t, (label, conf) in self.disk.get_many(ns, rest).items():
+                found[t] = (label, conf)
+                self.memory.put((ns, t), (label, conf))
+        with self._lock:
+            self.hits += n_mem
+            self.disk_hits += len(found) - n_mem
+            self.misses += len(texts) - len(found)
+        return found
+
+    def store(self, ns: str, preds: Dict[str, Tuple[str, float]]):
+        for t, pred in preds.items():
+            self.memory.put((ns, t), pred)
+        if self.disk is not None and preds:
+            self.disk.put_many(ns, list(preds.items()))
+
+    def stats(self) -> Dict:
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / total, 4) if total else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+_CACHE = ClassificationCache()
+
+
+def cache_stats() -> Dict:
+    return _CACHE.stats()
+
+
+def clear_cache():
+    """Drop the in-memory predictions (the on-disk tier is kept)."""
+    _CACHE.memory.clear()
+
+
+def _cache_namespace(max_length: int) -> str:
+    get_classifier()
+    return f"{_REGISTRY.checksum}:{_REGISTRY.backend_name}:{max_length}"
+
+
+def classify_cached(cleaned: List[str], classify_fn, max_length: int = MAX_LENGTH) -> List[Tuple[str, float]]:
+    """
+    (label, confidence) for each normalized line. Repeated lines are looked up once and
+    only cache misses are passed to classify_fn.
+    """
+    ns = _cache_namespace(max_length)
+    unique = list(dict.fromkeys(cleaned))
+    found = _CACHE.lookup(ns, unique)
+    misses = [t for t in unique if t not in found]
+    tracing.current().set(unique_lines=len(unique), cached_lines=len(found), cache_hit=not misses)
+    if misses:
+        fresh = dict(zip(misses, top_labels(classify_fn(misses))))
+        _CACHE.store(ns, fresh)
+        found.update(fresh)
+    return [found[t] for t in cleaned]
+
+
+def format_results(item_lines: List[str], cleaned: List[str], preds: List[Tuple[str, float]],
+                   threshold: float = 0.45) -> List[Dict]:
     results = []
-    for raw, cln, p in zip(item_lines, cleaned, probs):
-        best_id = int(np.argmax(p))
-        conf = float(np.max(p))
-        label = id2label[best_id]
+    for raw, cln, (label, conf) in zip(item_lines, cleaned, preds):
         if conf < threshold:
             label = "other"
         results.append({
@@ -97,4 +354,51 @@ def predict_items(item_lines: List[str], threshold: float = 0.45) -> List[Dict]:
             "category": label,
             "confidence": round(conf, 4)
         })
-    return results
\ No newline at end of file
+    return results
+
+
+def predict_items(item_lines: List[str], threshold: float = 0.45, max_length: int = MAX_LENGTH,
+                  batch_size: int = INFER_BATCH_SIZE) -> List[Dict]:
+
+    if not os.path.exists(_REGISTRY.model_dir):
+        return [{"line": "Error", "category": "Model path not found", "confidence": 0}]
+
+    cleaned = line_filter.normalize_lines(item_lines)
+    if not cleaned: return []
+
+    with tracing.span("nlp.predict_items", lines=len(cleaned)):
+        preds = classify_cached(
+            cleaned, lambda xs: classify_probs(xs, max_length=max_length, batch_size=batch_size), max_length
+        )
+    return format_results(item_lines, cleaned, preds, threshold)
+
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler():
+    """Shared micro-batching scheduler that feeds classify_probs (created on first use)."""
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        with _SCHEDULER_LOCK:
+            if _SCHEDULER is None:
+                from src.inference_queue import MicroBatchScheduler
+                _SCHEDULER = MicroBatchScheduler(classify_probs)
+    return _SCHEDULER
+
+
+def predict_items_batched(item_lines: List[str], threshold: float = 0.45, timeout: Optional[float] = None) -> List[Dict]:
+    """
+    Same output as predict_items, but the lines are merged with those of other
+    concurrent callers and classified in one padded batch.
+    """
+    if not os.path.exists(_REGISTRY.model_dir):
+        return [{"line": "Error", "category": "Model path not found", "confidence": 0}]
+
+    cleaned = line_filter.normalize_lines(item_lines)
+    if not cleaned: return []
+
+    with tracing.span("nlp.predict_items", lines=len(cleaned), batched=True):
+        preds = classify_cached(cleaned, lambda xs: get_scheduler().submit(xs).result(timeout=timeout))
+    return format_results(item_lines, cleaned, preds, threshold)
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+
+# pytesseract : forks the tesseract binary for every image (original behaviour)
+# tesserocr   : in-process libtesseract API, traineddata stays loaded between images.
+#               tesserocr imports cysignals, which installs signal handlers and so can only be
+#               imported on the main thread. Streamlit runs app.py on another thread: unless
+#               tesserocr was imported on the main thread already, "pool" is used instead.
+# pool        : persistent worker processes, each holding its own loaded tesserocr API
+OCR_BACKENDS = ("pytesseract", "tesserocr", "pool")
+OCR_BACKEND = os.environ.get("SSCA_OCR_BACKEND", "pytesseract")
+OCR_LANG = os.environ.get("SSCA_OCR_LANG", "eng")
+OCR_POOL_SIZE = int(os.environ.get("SSCA_OCR_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# Only needed when tesseract is not on PATH / traineddata is not in the default location
+TESSERACT_CMD = os.environ.get("SSCA_TESSERACT_CMD", "")
+TESSDATA_PREFIX = os.environ.get("SSCA_TESSDATA_PREFIX", os.environ.get("TESSDATA_PREFIX", ""))
+
+
+def _tesserocr_api():
+    import tesserocr
+
+    kwargs = {"lang": OCR_LANG}
+    if TESSDATA_PREFIX:
+        kwargs["path"] = TESSDATA_PREFIX.rstrip("/\\") + os.sep
+    return tesserocr.PyTessBaseAPI(**kwargs)
+
+
+class PytesseractBackend:
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+
+        if TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        self._pytesseract = pytesseract
+
+    def image_to_string(self, img: Image.Image) -> str:
+        return self._pytesseract.image_to_string(img, lang=OCR_LANG)
+
+
+class TesserocrBackend:
+    """
+    Long-lived in-process engines. Each API instance is used by one thread at a time;
+    tesserocr releases the GIL while recognising, so up to `size` images run in parallel.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, size: int = OCR_POOL_SIZE):
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._size = max(size, 1)
+        self._lock = threading.Lock()
+        self._idle.put(_tesserocr_api())  # fail fast if the library or traineddata is missing
+        self._created = 1
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self._size:
+                self._created += 1
+                return _tesserocr_api()
+        return self._idle.get()
+
+    def image_to_string(self, img: Image.Image) -> str:
+        api = self._acquire()
+        try:
+            api.SetImage(img)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+
+_WORKER_API = None
+
+
+def _init_worker():
+    global _WORKER_API
+    _WORKER_API = _tesserocr_api()
+
+
+def _worker_ocr(img: Image.Image) -> str:
+    _WORKER_API.SetImage(img)
+    try:
+        return _WORKER_API.GetUTF8Text()
+    finally:
+        _WORKER_API.Clear()
+
+
+class WorkerPoolBackend:
+    """Pool of persistent processes that load the traineddata once at start-up."""
+
+    name = "pool"
+
+    def __init__(self, size: int = OCR_POOL_SIZE):
+        # spawn: the caller (Streamlit, the service) already runs threads, forking it is unsafe
+        self._pool = ProcessPoolExecutor(max_workers=max(size, 1), initializer=_init_worker,
+                                         mp_context=multiprocessing.get_context("spawn"))
+
+    def image_to_string(self, img: Image.Image) -> str:
+        return self._pool.submit(_worker_ocr, img).result()
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def tesserocr_importable() -> bool:
+    """tesserocr can be imported here: already imported, or we are on the main thread (see OCR_BACKENDS)."""
+    return "tesserocr" in sys.modules or threading.current_thread() is threading.main_thread()
+
+
+def load_ocr_backend(name: str):
+    if name == "pytesseract":
+        return PytesseractBackend()
+    if name == "tesserocr":
+        if not tesserocr_importable():
+            print(f"OCR backend 'tesserocr' cannot be loaded from thread {threading.current_thread().name!r} "
+                  "(tesserocr must first be imported on the main thread); using the 'pool' backend instead.")
+            return WorkerPoolBackend()
+        return TesserocrBackend()
+    if name == "pool":
+        return WorkerPoolBackend()
+    raise ValueError(f"Unknown OCR backend '{name}', expected one of {OCR_BACKENDS}")
+
+
+def get_ocr_backend():
+    """Process-wide OCR backend selected by SSCA_OCR_BACKEND (created on first use)."""
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                _BACKEND = load_ocr_backend(OCR_BACKEND)
+    return _BACKEND
+
+
+def current_backend_name() -> str:
+    return _BACKEND.name if _BACKEND is not None else OCR_BACKEND
+
+
+def set_ocr_backend(name: str):
+    """Switch the process-wide backend at runtime."""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        old, _BACKEND = _BACKEND, load_ocr_backend(name)
+    if hasattr(old, "shutdown"):
+        old.shutdown()
+    return _BACKEND
@@ -0,0 +1,147 @@
+"""
+Content-addressed cache of OCR results.
+
+The key is the sha256 of the image bytes; the namespace is a fingerprint of the
+OCR engine, language and preprocessing profile, so changing any of them misses
+instead of serving stale text. Results live in a memory LRU and in a SQLite
+file shared by every session and kept across restarts.
+
+Pre-warm a directory:
+    python -m src.ocr_cache warm train/img
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from src.cache_store import LRUCache, SQLiteStore
+from src.ocr_backends import OCR_LANG, current_backend_name
+from src.ocr_strips import OCR_STRIP_OVERLAP, OCR_STRIPS
+from src.preprocess import get_profile
+
+
+OCR_CACHE_SIZE = int(os.environ.get("SSCA_OCR_CACHE_SIZE", "256"))
+# Empty string disables the on-disk tier
+OCR_CACHE_DB = os.environ.get(
+    "SSCA_OCR_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "ocr_cache.sqlite"),
+)
+
+_MEMORY = LRUCache(OCR_CACHE_SIZE)
+_DISK = None
+_STATS = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def _disk():
+    global _DISK
+    if _DISK is None and OCR_CACHE_DB:
+        _DISK = SQLiteStore(OCR_CACHE_DB, table="ocr_results")
+    return _DISK
+
+
+def read_image_bytes(image_file) -> bytes:
+    """
+    Bytes of a path, a Streamlit UploadedFile or any binary file-like object.
+    In-memory buffers (bytes, bytearray, memoryview) are returned as they are, without a copy.
+    """
+    if isinstance(image_file, (bytes, bytearray, memoryview)):
+        return image_file
+    if isinstance(image_file, (str, os.PathLike)):
+        with open(image_file, "rb") as f:
+            return f.read()
+    if hasattr(image_file, "getvalue"):
+        return image_file.getvalue()
+    pos = image_file.tell()
+    data = image_file.read()
+    image_file.seek(pos)
+    return data
+
+
+def config_fingerprint(profile=None, strips=None) -> str:
+    cfg = {"backend": current_backend_name(), "lang": OCR_LANG, "preprocess": get_profile(profile)}
+    strips = OCR_STRIPS if strips is None else strips
+    if strips > 1:  # stitched text can differ slightly from a single pass
+        cfg["strips"] = strips
+        cfg["strip_overlap"] = OCR_STRIP_OVERLAP
+    return hashlib.sha256(json.dumps(cfg, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def cache_key(data: bytes, profile=None, strips=None) -> Tuple[str, str]:
+    return config_fingerprint(profile, strips), hashlib.sha256(data).hexdigest()
+
+
+def get_cached(ns: str, key: str) -> Optional[Tuple[str, List[str]]]:
+    hit = _MEMORY.get((ns, key))
+    if hit is not None:
+        _STATS["hits"] += 1
+        return hit
+    disk = _disk()
+    if disk is not None:
+        value = disk.get(ns, key)
+        if value is not None:
+            hit = (value["text"], value["lines"])
+            _MEMORY.put((ns, key), hit)
+            _STATS["disk_hits"] += 1
+            return hit
+    _STATS["misses"] += 1
+    return None
+
+
+def put_cached(ns: str, key: str, text: str, lines: List[str]):
+    _MEMORY.put((ns, key), (text, lines))
+    disk = _disk()
+    if disk is not None:
+        disk.put(ns, key, {"text": text, "lines": lines})
+
+
+def cache_stats():
+    return dict(_STATS, memory_entries=len(_MEMORY))
+
+
+def _ocr_uncached(path: str, profile):
+    from src.ocr_engine import ocr_image
+
+    return ocr_image(path, profile=profile, use_cache=False)
+
+
+def warm_directory(img_dir: str, profile=None, workers: int = None) -> dict:
+    """OCR every image of img_dir that is not cached yet, in a process pool."""
+    from src.batch_pipeline import list_images
+
+    t0 = time.perf_counter()
+    todo = []
+    paths = list_images(img_dir)
+    for path in paths:
+        ns, key = cache_key(read_image_bytes(path), profile)
+        if get_cached(ns, key) is None:
+            todo.append((path, ns, key))
+
+    stored = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_ocr_uncached, [p for p, _, _ in todo], [profile] * len(todo))
+        for (path, ns, key), (text, lines) in zip(todo, results):
+            if lines:  # empty output usually means an OCR error, do not pin it
+                put_cached(ns, key, text, lines)
+                stored += 1
+    return {"images": len(paths), "already_cached": len(paths) - len(todo), "stored": stored,
+            "elapsed_s": round(time.perf_counter() - t0, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_warm = sub.add_parser("warm", help="OCR a directory into the cache")
+    p_warm.add_argument("img_dir")
+    p_warm.add_argument("--profile", default=None, help="Preprocessing profile (default: SSCA_OCR_PREPROCESS)")
+    p_warm.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "warm":
+        print(json.dumps(warm_directory(args.img_dir, args.profile, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
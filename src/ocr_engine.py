@@ -1,32 +1,76 @@
-import pytesseract
 from PIL import Image
+import io
 import re
 import os
+from src.preprocess import preprocess_image
+from src.ocr_backends import get_ocr_backend
+from src import ocr_cache, ocr_strips, line_filter, tracing
 
 
-pytesseract.pytesseract.tesseract_cmd = r"D:\15_MAI\7002\ocr\tesseract.exe"
+def decode_image(image_file):
+    """
+    读取并解码图片一次，结果可在会话中保存并传给 ocr_image(image=...)
+    Read and decode an image once; keep the result per session and pass it to ocr_image(image=...)
+    :return: (image bytes, decoded PIL image)
+    """
+    data = ocr_cache.read_image_bytes(image_file)
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return data, img
 
-def ocr_image(image_file):
+
+def ocr_image(image_file, profile=None, use_cache=True, image=None, strips=None):
     """
     运行 OCR 识别图片文字
-    :param image_file: Streamlit 上传的 file_uploader 对象或图片路径
+    :param image_file: Streamlit 上传的 file_uploader 对象、图片路径或内存中的 bytes / memoryview
+    :param profile: 预处理配置名 (见 src/preprocess.py)，None 表示使用 SSCA_OCR_PREPROCESS
+    :param use_cache: 相同图片 + 相同引擎配置直接返回缓存结果 (见 src/ocr_cache.py)
+    :param image: 已解码的 PIL 图片 (见 decode_image)，避免重复解码
+    :param strips: 长小票切成最多几条并行识别 (见 src/ocr_strips.py)，None 表示使用 SSCA_OCR_STRIPS，0 表示关闭
     :return: (full_text, lines)
     """
-    try:
-
-        img = Image.open(image_file)
-        
+    with tracing.span("ocr") as sp:
+        try:
+            data = ocr_cache.read_image_bytes(image_file)
+            sp.set(bytes=len(data))
+            if use_cache:
+                ns, key = ocr_cache.cache_key(data, profile, strips)
+                cached = ocr_cache.get_cached(ns, key)
+                sp.set(cache_hit=cached is not None)
+                if cached is not None:
+                    sp.set(lines=len(cached[1]))
+                    return cached
+
+            img = image if image is not None else Image.open(io.BytesIO(data))
+            sp.set(width=img.width, height=img.height)
+            with tracing.span("ocr.preprocess", profile=profile):
+                img = preprocess_image(img, profile)
+
+
+            # 引擎由 SSCA_OCR_BACKEND 配置 (pytesseract / tesserocr / pool)
+            # The engine comes from SSCA_OCR_BACKEND (pytesseract / tesserocr / pool)
+            backend = get_ocr_backend()
+            # 长小票按空白行切条，多核并行识别后拼接
+            # Tall receipts are cut into strips at blank rows and read in parallel
+            max_strips = ocr_strips.OCR_STRIPS if strips is None else strips
+            with tracing.span("ocr.engine", backend=backend.name):
+                if ocr_strips.use_strips(img, max_strips):
+                    raw_text = ocr_strips.ocr_strips(img, backend, max_strips)
+                else:
+                    raw_text = backend.image_to_string(img)
+            
 
-        raw_text = pytesseract.image_to_string(img)
-        
+            lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
+            clean_text = "\n".join(lines)
+            sp.set(lines=len(lines))
 
-        lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
-        clean_text = "\n".join(lines)
-        
-        return clean_text, lines
-    except Exception as e:
-        print(f"OCR Error: {e}")
-        return "", []
+            if use_cache and lines:
+                ocr_cache.put_cached(ns, key, clean_text, lines)
+            return clean_text, lines
+        except Exception as e:
+            sp.fail(e)
+            print(f"OCR Error: {e}")
+            return "", []
 
 def extract_total(lines):
     """
@@ -68,28 +112,7 @@ def extract_total(lines):
     return "Not Found"
 
 def extract_candidate_items(lines):
-    candidates = []
-
-    blacklist = [
-        "total", "subtotal", "tax", "gst", "sst", "cash", "change", 
-        "address", "tel", "phone", "invoice", "receipt", "date", 
-        "time", "table", "cashier", "server", "pax", "sdn bhd", "jalan"
-    ]
-    
-
-    date_pattern = r"\d{1,2}\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\s+\d{4}"
-
-    noise_pattern = r"(?:\d+-\w+)|(?:\d{10,})"
-
-    for line in lines:
-        line_low = line.lower()
-        
-
-        if not any(k in line_low for k in blacklist):
-            if not re.search(date_pattern, line_low) and not re.search(noise_pattern, line_low):
-                if len(line) > 3 and any(c.isalpha() for c in line):
-                 
-                    clean_line = re.sub(r"\s+\d{1,3}(?:,\d{3})*(?:\.\d{2})\s*$", "", line)
-                    candidates.append(clean_line.strip())
-                    
-    return candidates
\ No newline at end of file
+    """
+    从 OCR 行中筛选商品行并去掉行尾价格 (规则见 src/line_filter.py)
+    """
+    return line_filter.filter_item_lines(lines)
@@ -0,0 +1,190 @@
+"""
+Strip-parallel OCR for tall receipts.
+
+A long receipt is cut into horizontal strips at blank gaps between text rows,
+each strip overlapping its neighbours by a few rows, and the strips are
+recognised at the same time on a thread pool. The OCR backends run in parallel
+from threads (tesserocr releases the GIL, "pool" and pytesseract use other
+processes). The strip texts are then joined in order.
+
+    SSCA_OCR_STRIPS=4 streamlit run app.py      # up to 4 strips for images >= SSCA_OCR_STRIP_MIN_HEIGHT px
+
+Cuts are only placed in rows without ink, so no text row is split between two
+strips and by default the strips do not overlap. Where no gap is found near an
+ideal cut, there are fewer strips. With SSCA_OCR_STRIP_OVERLAP > 0 the rows
+read twice are removed when the start of a strip repeats the end of the
+previous one line for line; lines that do not match are always kept, so a
+re-read row is at worst duplicated, never lost.
+Tesseract's own OpenMP threads compete with the strips; OMP_THREAD_LIMIT=1 is
+recommended when using this mode.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src import tracing
+
+
+# Maximum strips per image, 0 disables the mode
+OCR_STRIPS = int(os.environ.get("SSCA_OCR_STRIPS", "0"))
+# Images shorter than this (after preprocessing) are read in one piece
+OCR_STRIP_MIN_HEIGHT = int(os.environ.get("SSCA_OCR_STRIP_MIN_HEIGHT", "1600"))
+# Overlap between neighbouring strips, as a fraction of the strip height. Off by default:
+# Tesseract reads an overlapping row differently in the two strips often enough
+# (noise, columns split or merged) that it cannot always be recognised as a repeat.
+OCR_STRIP_OVERLAP = float(os.environ.get("SSCA_OCR_STRIP_OVERLAP", "0"))
+# Threads recognising strips (all images together), 0 for max(SSCA_OCR_STRIPS, CPU count).
+# The OCR backend's own pool size (SSCA_OCR_POOL_SIZE) bounds the parallelism too.
+OCR_STRIP_WORKERS = int(os.environ.get("SSCA_OCR_STRIP_WORKERS", "0"))
+# A row counts as blank when at most this share of its pixels is ink
+BLANK_ROW_INK = 0.002
+# Lines of two strips are the same row when their similarity (letters and digits only) is at least this
+SAME_LINE_RATIO = 0.7
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = _new_pool(OCR_STRIP_WORKERS)
+    return _POOL
+
+
+def _new_pool(workers: int) -> ThreadPoolExecutor:
+    workers = workers or max(OCR_STRIPS, os.cpu_count() or 1)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-strip")
+
+
+def set_strip_workers(workers: int):
+    """Resize the strip thread pool at runtime (0: the default size)."""
+    global _POOL, OCR_STRIP_WORKERS
+    with _POOL_LOCK:
+        OCR_STRIP_WORKERS = workers
+        old, _POOL = _POOL, _new_pool(workers)
+    if old is not None:
+        old.shutdown()
+
+
+def blank_rows(img: Image.Image) -> np.ndarray:
+    """Boolean mask of the rows without ink."""
+    gray = np.asarray(img.convert("L"))
+    _, bw = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return bw.mean(axis=1) <= BLANK_ROW_INK
+
+
+def _runs(mask: np.ndarray, min_len: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(starts, ends) of the runs of True in mask that are at least min_len long."""
+    # +1 where a run starts, -1 just after it ends
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = ends - starts >= min_len
+    return starts[keep], ends[keep]
+
+
+def blank_row_centers(blank: np.ndarray, min_gap: int = 3) -> np.ndarray:
+    """Centre row of every run of at least min_gap blank rows."""
+    starts, ends = _runs(blank, min_gap)
+    return (starts + ends) // 2
+
+
+def count_text_rows(blank: np.ndarray, top: int, bottom: int, min_height: int = 3) -> int:
+    return len(_runs(~blank[top:bottom], min_height)[0])
+
+
+def _nearest(centers: np.ndarray, target: float, lo: int, hi: int):
+    """Gap centre closest to target within (lo, hi), or None."""
+    inside = centers[(centers > lo) & (centers < hi)]
+    if not len(inside):
+        return None
+    return int(inside[np.argmin(np.abs(inside - target))])
+
+
+def plan_strips(blank: np.ndarray, max_strips: int, overlap: float = OCR_STRIP_OVERLAP) -> List[Tuple[int, int]]:
+    """(top, bottom) rows of each strip for an image with these blank rows.
+    Cuts and overlap edges all fall on blank rows."""
+    height = len(blank)
+    centers = blank_row_centers(blank)
+    step = height / max_strips
+    cuts, prev = [], 0
+    for i in range(1, max_strips):
+        # Snap each ideal cut to a gap within half a strip of it
+        cut = _nearest(centers, i * step, int(prev + step / 2), int(i * step + step / 2))
+        if cut is not None:
+            cuts.append(cut)
+            prev = cut
+
+    margin = overlap * step
+    bounds = [0] + cuts + [height]
+    strips = []
+    for i in range(len(bounds) - 1):
+        top, bottom = bounds[i], bounds[i + 1]
+        # Extend to the gap nearest to `margin` beyond the cut, but no more than 2 margins
+        if i > 0:
+            top = _nearest(centers, top - margin, max(bounds[i - 1], int(top - 2 * margin)), top) or top
+        if i < len(bounds) - 2:
+            bottom = _nearest(centers, bottom + margin, bottom, min(bounds[i + 2], int(bottom + 2 * margin))) or bottom
+        strips.append((top, bottom))
+    return strips
+
+
+def _key(line: str) -> str:
+    return "".join(c for c in line.lower() if c.isalnum())
+
+
+def _same_line(a: str, b: str) -> bool:
+    a, b = _key(a), _key(b)
+    return a == b or (min(len(a), len(b)) >= 3 and SequenceMatcher(None, a, b).ratio() >= SAME_LINE_RATIO)
+
+
+def repeated_lines(prev: List[str], lines: List[str], rows: int) -> int:
+    """
+    How many of the first lines of a strip repeat the last lines of the previous one:
+    the longest prefix of `lines` that matches a suffix of `prev` line for line.
+    A row may come out as two lines (columns), so up to 2 * rows lines are compared.
+    """
+    for n in range(min(2 * rows, len(lines), len(prev)), 0, -1):
+        if all(_same_line(a, b) for a, b in zip(lines[:n], prev[-n:])):
+            return n
+    return 0
+
+
+def stitch(parts: List[List[str]], overlap_rows: List[int]) -> List[str]:
+    """
+    Join the lines of consecutive strips. overlap_rows[i] is the number of text rows
+    shared by strips i and i+1; only a repeated prefix found by repeated_lines is
+    dropped, every other line is kept.
+    """
+    out = list(parts[0]) if parts else []
+    for lines, rows in zip(parts[1:], overlap_rows):
+        out.extend(lines[repeated_lines(out, lines, rows):])
+    return out
+
+
+def read_strips(img: Image.Image, backend, max_strips: int = OCR_STRIPS) -> Tuple[List[List[str]], List[int]]:
+    """(lines of each strip, text rows shared by consecutive strips), the strips read in parallel."""
+    blank = blank_rows(img)
+    strips = plan_strips(blank, max_strips)
+    overlap_rows = [count_text_rows(blank, nxt[0], cur[1]) for cur, nxt in zip(strips, strips[1:])]
+    with tracing.span("ocr.strips", strips=len(strips), height=img.height):
+        texts = list(_pool().map(lambda box: backend.image_to_string(img.crop((0, box[0], img.width, box[1]))),
+                                 strips))
+    return [[ln.strip() for ln in t.split("\n") if ln.strip()] for t in texts], overlap_rows
+
+
+def ocr_strips(img: Image.Image, backend, max_strips: int = OCR_STRIPS) -> str:
+    """Text of img read strip by strip in parallel, as backend.image_to_string would return it."""
+    return "\n".join(stitch(*read_strips(img, backend, max_strips)))
+
+
+def use_strips(img: Image.Image, max_strips: int) -> bool:
+    return max_strips > 1 and img.height >= OCR_STRIP_MIN_HEIGHT
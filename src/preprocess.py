@@ -0,0 +1,134 @@
+import os
+from typing import Dict, Optional, Union
+
+import cv2
+import imutils
+import numpy as np
+from PIL import Image
+
+
+# Each profile is a set of steps applied in a fixed order:
+# grayscale -> resize (to "dpi" when the file records one, else to "text_height") -> deskew
+# -> adaptive threshold -> border crop
+PROFILES = {
+    # Full-resolution image straight to Tesseract (original behaviour)
+    "none": {},
+    "gray": {"grayscale": True},
+    # Downscale so text rows are about text_height px tall; never upscales small scans
+    "fast": {"grayscale": True, "text_height": 28, "allow_upscale": False, "crop": True},
+    "full": {"grayscale": True, "text_height": 28, "allow_upscale": True, "deskew": True,
+             "threshold": True, "crop": True},
+}
+OCR_PREPROCESS = os.environ.get("SSCA_OCR_PREPROCESS", "none")
+
+# Tesseract is most accurate with capital letters around 20-30 px
+MIN_SCALE, MAX_SCALE = 0.25, 2.0
+
+
+def get_profile(profile: Union[str, Dict, None]) -> Dict:
+    if profile is None:
+        profile = OCR_PREPROCESS
+    if isinstance(profile, dict):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown preprocessing profile '{profile}', expected one of {list(PROFILES)}")
+    return PROFILES[profile]
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """Median height of character-sized connected components, in pixels of `gray`."""
+    small = imutils.resize(gray, width=min(gray.shape[1], 800))
+    ratio = gray.shape[1] / small.shape[1]
+    _, bw = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(bw, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    keep = (heights >= 3) & (heights <= 80) & (widths <= heights * 3)
+    if keep.sum() < 10:
+        return None
+    return float(np.median(heights[keep])) * ratio
+
+
+def resize_to_text_height(img: np.ndarray, gray: np.ndarray, target: float, allow_upscale: bool) -> np.ndarray:
+    height = estimate_text_height(gray)
+    if not height:
+        return img
+    scale = min(max(target / height, MIN_SCALE), MAX_SCALE)
+    if scale > 1 and not allow_upscale:
+        return img
+    if abs(scale - 1) < 0.1:
+        return img
+    interp = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interp)
+
+
+def deskew(gray: np.ndarray, max_angle: float = 10.0) -> np.ndarray:
+    """Rotate by the dominant text angle (minAreaRect over foreground pixels)."""
+    _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    coords = np.column_stack(np.where(bw > 0))
+    if len(coords) < 100:
+        return gray
+    angle = cv2.minAreaRect(coords[:, ::-1].astype(np.float32))[-1]
+    # The angle convention differs between OpenCV versions; map it to (-45, 45]
+    while angle <= -45:
+        angle += 90
+    while angle > 45:
+        angle -= 90
+    if abs(angle) < 0.3 or abs(angle) > max_angle:
+        return gray
+    h, w = gray.shape
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, m, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def adaptive_threshold(gray: np.ndarray) -> np.ndarray:
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+def crop_border(gray: np.ndarray, margin: int = 10) -> np.ndarray:
+    """Crop to the bounding box of the ink, dropping table/background borders."""
+    _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Open away speckles so they do not keep the box at full size
+    bw = cv2.morphologyEx(bw, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    pts = cv2.findNonZero(bw)
+    if pts is None:
+        return gray
+    x, y, w, h = cv2.boundingRect(pts)
+    H, W = gray.shape[:2]
+    x0, y0 = max(x - margin, 0), max(y - margin, 0)
+    x1, y1 = min(x + w + margin, W), min(y + h + margin, H)
+    if (x1 - x0) * (y1 - y0) < 0.2 * W * H:
+        return gray  # probably cropped to a logo or a stain
+    return gray[y0:y1, x0:x1]
+
+
+def preprocess_image(img: Image.Image, profile: Union[str, Dict, None] = None) -> Image.Image:
+    """
+    Apply a preprocessing profile to a PIL image before OCR.
+    :param profile: name from PROFILES, a dict of steps, or None for SSCA_OCR_PREPROCESS
+    """
+    steps = get_profile(profile)
+    if not steps:
+        return img
+
+    arr = np.asarray(img.convert("RGB"))
+    gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+    out = gray if steps.get("grayscale") else arr
+
+    src_dpi = (img.info.get("dpi") or (0, 0))[0]
+    if steps.get("dpi") and src_dpi:
+        scale = min(max(steps["dpi"] / float(src_dpi), MIN_SCALE), MAX_SCALE)
+        if scale < 1 or steps.get("allow_upscale", False):
+            out = cv2.resize(out, None, fx=scale, fy=scale,
+                             interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+            gray = out if out.ndim == 2 else cv2.cvtColor(out, cv2.COLOR_RGB2GRAY)
+    elif steps.get("text_height"):
+        out = resize_to_text_height(out, gray, steps["text_height"], steps.get("allow_upscale", False))
+        gray = out if out.ndim == 2 else cv2.cvtColor(out, cv2.COLOR_RGB2GRAY)
+    if steps.get("deskew"):
+        out = gray = deskew(gray)
+    if steps.get("threshold"):
+        out = adaptive_threshold(gray)
+    if steps.get("crop"):
+        out = crop_border(out) if out.ndim == 2 else out
+    return Image.fromarray(out)
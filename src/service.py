@@ -0,0 +1,237 @@
+"""
+Headless HTTP analysis service.
+
+    python -m src.service --host 0.0.0.0 --port 8000
+    curl --data-binary @train/img/X00016469612.jpg -H "Content-Type: image/jpeg" localhost:8000/analyze
+    curl -F files=@a.jpg -F files=@b.jpg "localhost:8000/analyze/batch?llm=true"
+    curl --data-binary @receipt.jpg "localhost:8000/analyze?escalate=true"   # LLM only when unsure
+
+Endpoints:
+    POST /analyze          one receipt, raw image bytes as the body (or multipart field "file")
+    POST /analyze/batch    several receipts, multipart fields "files"
+    GET  /healthz          the process is up
+    GET  /readyz           503 until the OCR workers and the classifier are warm
+    GET  /metrics          Prometheus text from src/tracing.py
+    GET  /stats            tier hit rates of the lexicon -> model -> LLM cascade
+
+OCR runs in a process pool and classification in a thread pool (through the
+micro-batching scheduler), so the event loop only parses requests and awaits
+the LLM. Workers and the classifier are warmed in the background at startup.
+The service keeps no per-client state, so replicas can be added behind a load
+balancer.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from src import tracing
+from src.batch_pipeline import ocr_bytes_task, warm_ocr_worker
+
+
+SERVICE_OCR_WORKERS = int(os.environ.get("SSCA_SERVICE_OCR_WORKERS", str(os.cpu_count() or 1)))
+SERVICE_THREADS = int(os.environ.get("SSCA_SERVICE_THREADS", "4"))
+SERVICE_MAX_BYTES = int(os.environ.get("SSCA_SERVICE_MAX_BYTES", str(10 * 1024 * 1024)))
+SERVICE_MAX_BATCH = int(os.environ.get("SSCA_SERVICE_MAX_BATCH", "32"))
+
+
+class AnalysisService:
+    """Worker pools, warm-up state and the per-receipt pipeline behind the HTTP routes."""
+
+    def __init__(self, ocr_workers: int = SERVICE_OCR_WORKERS, threads: int = SERVICE_THREADS):
+        self.ocr_workers = ocr_workers
+        self.threads = threads
+        self.ocr_pool = None
+        self.cpu_pool = None
+        self.llm = None
+        self.llm_error = None
+        self.state = {"ocr_workers_ready": False, "classifier_ready": False, "warmup_error": None}
+        self._warmup = None
+
+    async def start(self):
+        # spawn: forking a process that already runs threads (event loop, torch) is unsafe.
+        # Workers only import the OCR modules; the classifier lives in this process.
+        self.ocr_pool = ProcessPoolExecutor(self.ocr_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.cpu_pool = ThreadPoolExecutor(self.threads, thread_name_prefix="ssca-cpu")
+        try:
+            from src.llm_client import AsyncLLMClient
+            self.llm = AsyncLLMClient()
+        except Exception as e:  # no API key: the service still runs without LLM reports
+            self.llm_error = str(e)
+        self._warmup = asyncio.create_task(self.warm_up())
+
+    async def warm_up(self):
+        from src.nlp_engine import warm_up_classifier
+
+        loop = asyncio.get_running_loop()
+        try:
+            classifier = loop.run_in_executor(self.cpu_pool, warm_up_classifier)
+            workers = [loop.run_in_executor(self.ocr_pool, warm_ocr_worker) for _ in range(self.ocr_workers)]
+            await asyncio.gather(*workers)
+            self.state["ocr_workers_ready"] = True
+            self.state["classifier_ready"] = await classifier
+        except Exception as e:
+            self.state["warmup_error"] = str(e)
+
+    async def stop(self):
+        if self._warmup is not None:
+            self._warmup.cancel()
+        if self.llm is not None:
+            await self.llm.aclose()
+        self.ocr_pool.shutdown(cancel_futures=True)
+        self.cpu_pool.shutdown(cancel_futures=True)
+
+    def ready(self) -> bool:
+        return self.state["ocr_workers_ready"] and self.state["classifier_ready"]
+
+    def status(self) -> Dict:
+        from src.cascade import lexicon_status
+        from src.nlp_engine import classifier_status
+
+        return {
+            "ready": self.ready(),
+            **self.state,
+            "ocr_workers": self.ocr_workers,
+            "classifier": classifier_status(),
+            "lexicon": lexicon_status(),
+            "llm": {"available": self.llm is not None, "error": self.llm_error},
+        }
+
+    def _classify(self, text: str) -> Dict:
+        from src.cascade import classify_receipt
+
+        return classify_receipt(text, batched=True)
+
+    async def analyze(self, data: bytes, llm: bool = False, prompt_mode: Optional[str] = None,
+                      escalate: bool = False) -> Dict:
+        """llm=True always asks for the report; escalate=True only for receipts the local tiers are unsure of."""
+        loop = asyncio.get_running_loop()
+        with tracing.span("service.analyze", bytes=len(data), llm=llm, escalate=escalate) as sp:
+            result = await loop.run_in_executor(self.ocr_pool, ocr_bytes_task, data)
+            # The OCR spans were recorded in the worker process
+            tracing.record_spans(result.pop("spans", []))
+            if "error" in result:
+                sp.set(error=result["error"])
+                return result
+
+            t0 = time.perf_counter()
+            result.update(await loop.run_in_executor(self.cpu_pool, self._classify, result["text"]))
+            result["timings"]["classify_s"] = round(time.perf_counter() - t0, 3)
+
+            if llm or (escalate and result["escalate"]):
+                if self.llm is None:
+                    result["report"] = {"error": f"LLM unavailable: {self.llm_error}"}
+                else:
+                    from src.cascade import STATS
+
+                    STATS.add_llm_call()  # only requests actually sent to the LLM
+                    t0 = time.perf_counter()
+                    result["report"] = await self.llm.eco_report(
+                        result["text"], prompt_mode=prompt_mode, predictions=result["predictions"])
+                    result["timings"]["llm_s"] = round(time.perf_counter() - t0, 3)
+            return result
+
+
+service = AnalysisService()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await service.start()
+    yield
+    await service.stop()
+
+
+app = FastAPI(title="Sustainable Consumption Analyzer", lifespan=lifespan)
+
+
+async def _read_image(request: Request) -> bytes:
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(400, "Multipart requests need an image in the 'file' field")
+        data = await upload.read()
+    else:
+        data = await request.body()
+    if not data:
+        raise HTTPException(400, "Empty request body, expected image bytes")
+    if len(data) > SERVICE_MAX_BYTES:
+        raise HTTPException(413, f"Image larger than {SERVICE_MAX_BYTES} bytes")
+    return data
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    status = service.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracing.prometheus_text()
+
+
+@app.get("/stats")
+async def stats():
+    from src.cascade import cascade_stats
+
+    return cascade_stats()
+
+
+@app.post("/analyze")
+async def analyze(request: Request, llm: bool = False, prompt_mode: Optional[str] = None, escalate: bool = False):
+    result = await service.analyze(await _read_image(request), llm=llm, prompt_mode=prompt_mode, escalate=escalate)
+    if "error" in result:
+        raise HTTPException(422, result["error"])
+    return result
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request, llm: bool = False, prompt_mode: Optional[str] = None,
+                        escalate: bool = False):
+    form = await request.form()
+    uploads = [f for f in form.getlist("files") if not isinstance(f, str)]
+    if not uploads:
+        raise HTTPException(400, "Expected images in multipart 'files' fields")
+    if len(uploads) > SERVICE_MAX_BATCH:
+        raise HTTPException(413, f"At most {SERVICE_MAX_BATCH} images per request")
+
+    async def one(upload):
+        data = await upload.read()
+        if len(data) > SERVICE_MAX_BYTES:
+            return {"filename": upload.filename, "error": f"Image larger than {SERVICE_MAX_BYTES} bytes"}
+        return {"filename": upload.filename, **await service.analyze(data, llm=llm, prompt_mode=prompt_mode,
+                                                                      escalate=escalate)}
+
+    return {"results": await asyncio.gather(*(one(u) for u in uploads))}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    # Import torch/transformers before serving: importing them in the warm-up thread
+    # holds the GIL for seconds and stalls the event loop. Not at module level, because
+    # the spawned OCR workers import this module too.
+    import src.nlp_engine  # noqa: F401
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Lightweight timing spans for the receipt pipeline.
+
+    with tracing.span("ocr", backend="tesserocr") as sp:
+        ...
+        sp.set(lines=len(lines), cache_hit=False)
+
+Finished spans go to a ring buffer (recent_spans), to per-stage histograms
+(prometheus_text) and, with SSCA_TRACE_LOG=1, to the "src.tracing" logger as
+one JSON object per line. capture() collects the spans of one block, e.g. one
+Streamlit rerun for the debug panel.
+
+Tracing is off unless SSCA_TRACING=1 or set_enabled(True). While off, span()
+returns a shared no-op object: the cost is one function call and one flag test.
+The no-op span is falsy, so expensive attributes can be guarded with `if sp:`.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+TRACE_BUFFER = int(os.environ.get("SSCA_TRACE_BUFFER", "2000"))
+TRACE_LOG = os.environ.get("SSCA_TRACE_LOG", "0") == "1"
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Numeric span attributes that are also summed into counters
+COUNTED_ATTRS = ("lines", "prompt_tokens", "completion_tokens")
+
+logger = logging.getLogger(__name__)
+
+_enabled = os.environ.get("SSCA_TRACING", "0") == "1"
+_current = contextvars.ContextVar("ssca_span", default=None)
+_collector = contextvars.ContextVar("ssca_span_collector", default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=TRACE_BUFFER)
+_stages = {}  # name -> {"count", "sum", "errors", "buckets", "cache_hits", "cache_misses", "counted"}
+
+
+def set_enabled(flag: bool):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class Span:
+    __slots__ = ("name", "attrs", "parent", "start", "duration_s", "error", "_t0", "_token")
+
+    def __init__(self, name: str, attrs: Dict, parent: Optional[str]):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.start = time.time()
+        self.duration_s = None
+        self.error = None
+        self._t0 = time.perf_counter()
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def fail(self, error: BaseException):
+        """Mark the span as failed for an exception that the traced code handles itself."""
+        self.error = f"{type(error).__name__}: {error}"
+        return self
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.duration_s is not None:
+            return
+        self.duration_s = time.perf_counter() - self._t0
+        if error is not None:
+            self.fail(error)
+        _record(self)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.end(exc)
+        return False
+
+    def __bool__(self):
+        return True
+
+    def to_dict(self) -> Dict:
+        return {
+            "span": self.name,
+            "parent": self.parent,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_s * 1000, 3) if self.duration_s is not None else None,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        return self
+
+    def fail(self, error):
+        return self
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __bool__(self):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """Context manager timing a block; nested spans record their parent's name."""
+    if not _enabled:
+        return _NOOP
+    parent = _current.get()
+    return Span(name, attrs, parent.name if parent is not None else None)
+
+
+def current():
+    """The innermost open span of this context (a no-op span if there is none)."""
+    return _current.get() or _NOOP
+
+
+def start_span(name: str, **attrs):
+    """A span that is ended explicitly with .end() and does not become the parent of other spans.
+    For generators, whose body runs in the consumer's context between yields."""
+    return span(name, **attrs)
+
+
+def _record(sp: Span):
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(sp)
+    with _lock:
+        _recent.append(sp)
+        stage = _stages.get(sp.name)
+        if stage is None:
+            stage = _stages[sp.name] = {"count": 0, "sum": 0.0, "errors": 0, "buckets": [0] * len(BUCKETS),
+                                        "cache_hits": 0, "cache_misses": 0, "counted": {}}
+        stage["count"] += 1
+        stage["sum"] += sp.duration_s
+        for i, bound in enumerate(BUCKETS):
+            if sp.duration_s <= bound:
+                stage["buckets"][i] += 1
+        if sp.error:
+            stage["errors"] += 1
+        hit = sp.attrs.get("cache_hit")
+        if hit is True:
+            stage["cache_hits"] += 1
+        elif hit is False:
+            stage["cache_misses"] += 1
+        for attr in COUNTED_ATTRS:
+            value = sp.attrs.get(attr)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                stage["counted"][attr] = stage["counted"].get(attr, 0) + value
+    if TRACE_LOG:
+        logger.info(json.dumps(sp.to_dict(), default=str))
+
+
+def record_spans(rows: List[Dict]):
+    """
+    Record spans finished in another process, given as their to_dict() rows (e.g. the
+    OCR spans of a worker process). Spans without a parent get the current span as parent.
+    """
+    if not _enabled:
+        return
+    outer = _current.get()
+    for row in rows:
+        attrs = dict(row)
+        sp = Span(attrs.pop("span"), {}, attrs.pop("parent", None) or (outer.name if outer is not None else None))
+        sp.start = attrs.pop("start", sp.start)
+        duration_ms = attrs.pop("duration_ms", None)
+        sp.duration_s = duration_ms / 1000 if duration_ms is not None else 0.0
+        sp.error = attrs.pop("error", None)
+        sp.attrs = attrs
+        _record(sp)
+
+
+def begin_capture() -> List[Span]:
+    """Start collecting the spans finished from here on in this context, e.g. for the
+    rest of a Streamlit script run; the previous collection, if any, is replaced."""
+    spans = []
+    _collector.set(spans)
+    return spans
+
+
+@contextmanager
+def capture():
+    """Collect the spans finished inside the block (same thread / asyncio task)."""
+    spans = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+
+def recent_spans(limit: Optional[int] = None) -> List[Dict]:
+    with _lock:
+        spans = list(_recent)
+    return [sp.to_dict() for sp in (spans[-limit:] if limit else spans)]
+
+
+def json_lines(spans: Optional[List] = None) -> str:
+    """Spans as newline-delimited JSON (default: the whole ring buffer)."""
+    rows = recent_spans() if spans is None else [sp.to_dict() if isinstance(sp, Span) else sp for sp in spans]
+    return "".join(json.dumps(r, default=str) + "\n" for r in rows)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    """Per-stage metrics in the Prometheus text exposition format."""
+    with _lock:
+        stages = {name: dict(s, buckets=list(s["buckets"]), counted=dict(s["counted"]))
+                  for name, s in sorted(_stages.items())}
+
+    out = [
+        "# HELP ssca_stage_duration_seconds Time spent in each pipeline stage.",
+        "# TYPE ssca_stage_duration_seconds histogram",
+    ]
+    for name, s in stages.items():
+        stage = _label(name)
+        for bound, count in zip(BUCKETS, s["buckets"]):
+            out.append(f'ssca_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        out.append(f'ssca_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {s["count"]}')
+        out.append(f'ssca_stage_duration_seconds_sum{{stage="{stage}"}} {s["sum"]:.6f}')
+        out.append(f'ssca_stage_duration_seconds_count{{stage="{stage}"}} {s["count"]}')
+
+    out += ["# HELP ssca_stage_errors_total Spans that ended with an exception.",
+            "# TYPE ssca_stage_errors_total counter"]
+    out += [f'ssca_stage_errors_total{{stage="{_label(n)}"}} {s["errors"]}' for n, s in stages.items()]
+
+    out += ["# HELP ssca_stage_cache_total Cache lookups made by a stage.",
+            "# TYPE ssca_stage_cache_total counter"]
+    for name, s in stages.items():
+        if s["cache_hits"] or s["cache_misses"]:
+            out.append(f'ssca_stage_cache_total{{stage="{_label(name)}",result="hit"}} {s["cache_hits"]}')
+            out.append(f'ssca_stage_cache_total{{stage="{_label(name)}",result="miss"}} {s["cache_misses"]}')
+
+    out += ["# HELP ssca_stage_units_total Lines and tokens processed by a stage.",
+            "# TYPE ssca_stage_units_total counter"]
+    for name, s in stages.items():
+        for attr, value in sorted(s["counted"].items()):
+            out.append(f'ssca_stage_units_total{{stage="{_label(name)}",unit="{attr}"}} {value}')
+    return "\n".join(out) + "\n"
+
+
+def reset():
+    """Forget recorded spans and metrics."""
+    with _lock:
+        _recent.clear()
+        _stages.clear()